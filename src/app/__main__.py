@@ -1,21 +1,158 @@
-from config import DOWNLOAD_DIR, MONGO_URI, MONGO_DB_NAME, MONGO_COLLECTION
-from clients.selenium_client import SeleniumClient
+# src/app/__main__.py
+import argparse
+import logging
+import threading
+
+from config import DOWNLOAD_DIR, HISTORICAL_URLS, MONGO_DB_NAME, MONGO_URI, RSS_FEEDS
 from dao.mongo_manager_dao import MongoManagerDAO
-from dao.file_manager_dao import FileManagerDAO
-from services.download_service import DownloadService
+from logging_config import setup_logging
+from metrics import run_metrics
+from services.pipeline_service import PipelineOrchestrator, PipelineStage
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class PipelineContext:
+    """
+    Resources shared by every stage of a pipeline run: one Mongo client and the analysis
+    models, each loaded once on first use. warm_up() loads the models in the background so
+    that loading overlaps with the collection stages.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO):
+        self.mongo_manager = mongo_manager
+        self._lock = threading.Lock()
+        self._sentiment_predictor = None
+        self._topic_analyzer = None
+
+    @property
+    def sentiment_predictor(self):
+        with self._lock:
+            if self._sentiment_predictor is None:
+                from mains.main_analyze_sentiment_model_rss_feeds import SentimentPredictor
+
+                self._sentiment_predictor = SentimentPredictor(self.mongo_manager)
+            predictor = self._sentiment_predictor
+        predictor.load()
+        return predictor
+
+    @property
+    def topic_analyzer(self):
+        with self._lock:
+            if self._topic_analyzer is None:
+                from mains.main_analyze_topic_model_rss_feeds import SimpleTopicAnalyzer
+
+                self._topic_analyzer = SimpleTopicAnalyzer(self.mongo_manager)
+            return self._topic_analyzer
+
+    def warm_up(self, stage_names: set):
+        """Start loading the models needed by the selected stages"""
+
+        def load(resource: str):
+            try:
+                getattr(self, resource)
+            except Exception as e:
+                # The stage using the resource reports the error
+                logger.warning(f"Warm-up of {resource} failed: {e}")
+
+        for stage_name, resource in (("sentiment", "sentiment_predictor"), ("topic", "topic_analyzer")):
+            if stage_name in stage_names:
+                threading.Thread(target=load, args=(resource,), name=f"warmup-{stage_name}", daemon=True).start()
+
+    def close(self):
+        if self._topic_analyzer is not None:
+            self._topic_analyzer.close()
+
+
+# ---------------- Stages ----------------
+
+
+def collect_rss(context: PipelineContext) -> dict:
+    from services.rss_collector_service import RSSCollectorService
+
+    rss_service = RSSCollectorService(context.mongo_manager)
+    rss_service.fetch_and_store(RSS_FEEDS)
+    return {"analysis_text_backfilled": rss_service.backfill_analysis_text()}
+
+
+def collect_historical(context: PipelineContext) -> dict:
+    from clients.selenium_client import SeleniumClient
+    from dao.file_manager_dao import FileManagerDAO
+    from services.download_service import DownloadService
 
-def main():
     selenium_client = SeleniumClient(DOWNLOAD_DIR)
-    file_manager = FileManagerDAO(DOWNLOAD_DIR)
-    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME, MONGO_COLLECTION)
-    service = DownloadService(selenium_client, file_manager, mongo_manager)
+    try:
+        DownloadService(selenium_client, FileManagerDAO(DOWNLOAD_DIR), context.mongo_manager).download_and_store(HISTORICAL_URLS)
+    finally:
+        selenium_client.quit()
+    return {"urls": len(HISTORICAL_URLS)}
+
+
+def compute_indicators(context: PipelineContext) -> dict:
+    from services.indicators_service import IndicatorsService
+
+    written = IndicatorsService(context.mongo_manager).update_all()
+    return {"tickers": len(written), "bars": sum(written.values())}
+
+
+def analyze_sentiment(context: PipelineContext) -> dict:
+    return {"analyzed": len(context.sentiment_predictor.process_rss_feeds())}
+
+
+def analyze_topics(context: PipelineContext) -> dict:
+    return {"analyzed": len(context.topic_analyzer.process_feeds())}
+
 
-    urls = [
-        ("https://www.rava.com/perfil/DOLAR%20MEP", "Dolar MEP")
+STAGES = [
+    PipelineStage("collect_rss", collect_rss),
+    PipelineStage("sentiment", analyze_sentiment, depends_on=("collect_rss",)),
+    PipelineStage("topic", analyze_topics, depends_on=("collect_rss",)),
+    PipelineStage("collect_historical", collect_historical),
+    PipelineStage("indicators", compute_indicators, depends_on=("collect_historical",)),
+]
+
+
+def select_stages(names: list[str] | None) -> list[PipelineStage]:
+    """Stages to run; dependencies outside the selection are considered already satisfied"""
+    if not names:
+        return STAGES
+    unknown = set(names) - {stage.name for stage in STAGES}
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+    return [
+        PipelineStage(stage.name, stage.run, [dependency for dependency in stage.depends_on if dependency in names]) for stage in STAGES if stage.name in names
     ]
-    service.download_and_store(urls)
 
-    selenium_client.quit()
+
+def main():
+    """Run collection and analysis stages as a dependency graph"""
+    parser = argparse.ArgumentParser(description="Run the data collection and analysis pipeline")
+    parser.add_argument("--stages", type=lambda value: value.split(","), help=f"Comma separated subset of: {','.join(stage.name for stage in STAGES)}")
+    parser.add_argument("--resume", action="store_true", help="Resume the last unfinished run, skipping its completed stages")
+    parser.add_argument("--workers", type=int, help="Stages run concurrently (default: all independent stages)")
+    args = parser.parse_args()
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    mongo_manager.ping()
+
+    stages = select_stages(args.stages)
+    orchestrator = PipelineOrchestrator(mongo_manager, stages, max_workers=args.workers)
+    resume_run_id = orchestrator.last_unfinished_run_id() if args.resume else None
+    if args.resume and resume_run_id is None:
+        logger.info("No unfinished pipeline run to resume, starting a new one")
+
+    context = PipelineContext(mongo_manager)
+    context.warm_up({stage.name for stage in stages})
+    try:
+        with run_metrics("pipeline"):
+            summary = orchestrator.run(context, resume_run_id=resume_run_id)
+    finally:
+        context.close()
+
+    if summary["status"] != "success":
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -25,6 +25,74 @@ MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 BYMA_COLLECTION = os.getenv("BYMA_COLLECTION")
 RSS_COLLECTION = os.getenv("RSS_COLLECTION")
+INDICATORS_COLLECTION = os.getenv("INDICATORS_COLLECTION", "byma_indicators")
+
+# === Indicators settings ===
+# Bars recomputed before the last stored bar on each incremental run.
+# Must be large enough for EMA/RSI/ATR smoothing to converge (several times the longest period).
+INDICATORS_WARMUP_BARS = int(os.getenv("INDICATORS_WARMUP_BARS", 250))
+
+# === Sentiment analysis settings ===
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", 32))
+SENTIMENT_NUM_THREADS = int(os.getenv("SENTIMENT_NUM_THREADS", os.cpu_count() or 1))
+# Worker processes for sharded scoring; torch threads are split evenly between them
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", 1))
+# "torch" or "onnx" (requires an export made with mains.main_export_sentiment_model_onnx)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")
+# Minimum share of identical labels between torch and ONNX models for an export to be registered
+ONNX_PARITY_MIN_AGREEMENT = float(os.getenv("ONNX_PARITY_MIN_AGREEMENT", 0.98))
+
+# === Topic analysis settings ===
+# Worker processes for YAKE keyphrase extraction (1 = in-process)
+TOPIC_WORKERS = int(os.getenv("TOPIC_WORKERS", 1))
+# "yake" or "keybert" (embedding based, document embeddings persisted in EMBEDDINGS_DIR)
+TOPIC_EXTRACTOR = os.getenv("TOPIC_EXTRACTOR", "yake")
+KEYBERT_MODEL = os.getenv("KEYBERT_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+KEYBERT_BATCH_SIZE = int(os.getenv("KEYBERT_BATCH_SIZE", 64))
+# Directory of the memory-mapped document embedding stores
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", os.path.join(BASE_DIR, "embeddings"))
+# Half-life of the time-decayed keyphrase trend scores
+KEYPHRASE_TREND_HALF_LIFE_HOURS = float(os.getenv("KEYPHRASE_TREND_HALF_LIFE_HOURS", 24))
+
+# === Prediction cache settings ===
+# Sentiment and topic results cached by (sha256(prepared text), model/extractor id)
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "True").lower() == "true"
+PREDICTION_CACHE_MEMORY_ITEMS = int(os.getenv("PREDICTION_CACHE_MEMORY_ITEMS", 10000))
+
+# === Streaming analysis settings ===
+# Micro-batches are flushed when full or after waiting this long for more feeds
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 32))
+STREAM_MAX_WAIT_SECONDS = float(os.getenv("STREAM_MAX_WAIT_SECONDS", 2))
+
+# === Metrics and profiling ===
+# Directory of the node-exporter textfile collector; <job>.prom is written at the end of each run
+METRICS_TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR")
+# Port of the /metrics HTTP endpoint started by long-running services (unset = disabled)
+METRICS_HTTP_PORT = int(os.getenv("METRICS_HTTP_PORT", 0)) or None
+# When set, each run dumps a cProfile .pstats file and top tracemalloc allocations here
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+
+# === RSS collection settings ===
+RSS_FETCH_TIMEOUT_SECONDS = float(os.getenv("RSS_FETCH_TIMEOUT_SECONDS", 30))
+# Raw fetched feeds are archived zstd-compressed for offline replays: "local", "gridfs" or "" (disabled)
+RAW_ARCHIVE_BACKEND = os.getenv("RAW_ARCHIVE_BACKEND", "local")
+RAW_ARCHIVE_DIR = os.getenv("RAW_ARCHIVE_DIR", os.path.join(BASE_DIR, "raw_archive"))
+RAW_ARCHIVE_ZSTD_LEVEL = int(os.getenv("RAW_ARCHIVE_ZSTD_LEVEL", 10))
+
+# === Job queue settings ===
+# A claimed job stays leased to its worker this long unless the worker heartbeats
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 300))
+# Attempts before a job whose handler failed, or whose lease expired, is marked failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# Idle wait between claim attempts when the queue is empty
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+# Feeds per sentiment_shard job
+SENTIMENT_SHARD_SIZE = int(os.getenv("SENTIMENT_SHARD_SIZE", 2000))
+
+# === Retention settings ===
+# Documents older than this (by _id creation time) keep only a slim stub; their full text moves to <collection>_cold
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", 90))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 1000))
 
 # URLs / Feeds
 HISTORICAL_URLS = [
@@ -0,0 +1,166 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class EmbeddingStoreDAO:
+    """
+    Append-only store of float32 document embeddings keyed by feedId, kept on disk as:
+    - <name>.f32: row-major (rows, dim) float32 matrix, read through a memory map
+    - <name>.ids: one feedId per line, line i is the key of row i
+    - <name>.json: store metadata (model name and embedding dimension)
+    Vectors are L2-normalized on write, so dot products are cosine similarities.
+    Appends and reloads hold an exclusive flock on <name>.lock, so several processes
+    (e.g. a streaming and a batch topic run) can share a store.
+    """
+
+    def __init__(self, directory: str, name: str, dim: int, metadata: dict | None = None):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = os.path.join(self.directory, f"{name}.f32")
+        self.ids_path = os.path.join(self.directory, f"{name}.ids")
+        self.metadata_path = os.path.join(self.directory, f"{name}.json")
+        self.lock_path = os.path.join(self.directory, f"{name}.lock")
+        self._lock = threading.Lock()
+
+        self._check_metadata({"dim": dim, **(metadata or {})})
+        self.ids = []
+        self.rows = {}
+        self._vectors = None
+        with self._file_lock():
+            self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with other processes using the same store"""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _check_metadata(self, metadata: dict):
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, encoding="utf-8") as metadata_file:
+                stored = json.load(metadata_file)
+            if stored != metadata:
+                raise ValueError(f"Embedding store {self.metadata_path} was built with {stored}, expected {metadata}")
+        else:
+            with open(self.metadata_path, "w", encoding="utf-8") as metadata_file:
+                json.dump(metadata, metadata_file)
+
+    def _load(self):
+        """
+        Read the id list and map the vectors, dropping the tail of an interrupted append.
+        Must be called with the file lock held, since another process may be appending.
+        """
+        ids = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, encoding="utf-8") as ids_file:
+                ids = ids_file.read().split()
+
+        row_bytes = 4 * self.dim
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = min(len(ids), vectors_size // row_bytes)
+        if vectors_size != rows * row_bytes:
+            os.truncate(self.vectors_path, rows * row_bytes)
+        if len(ids) != rows:
+            with open(self.ids_path, "w", encoding="utf-8") as ids_file:
+                ids_file.write("".join(f"{feed_id}\n" for feed_id in ids[:rows]))
+
+        self.ids = ids[:rows]
+        self.rows = {feed_id: row for row, feed_id in enumerate(self.ids)}
+        self._vectors = None
+
+    def refresh(self):
+        """Pick up rows appended by other processes"""
+        with self._lock, self._file_lock():
+            self._load()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only memory map over the stored vectors"""
+        if self._vectors is None:
+            if not self.ids:
+                return np.empty((0, self.dim), dtype=np.float32)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        return self._vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, feed_id) -> bool:
+        return str(feed_id) in self.rows
+
+    def get_many(self, feed_ids: list) -> dict:
+        """Stored vectors by feedId, for the feedIds present in the store"""
+        found = [(feed_id, self.rows[str(feed_id)]) for feed_id in feed_ids if str(feed_id) in self.rows]
+        if not found:
+            return {}
+        matrix = self.vectors[[row for _, row in found]]
+        return {feed_id: matrix[index] for index, (feed_id, _) in enumerate(found)}
+
+    def add_many(self, feed_ids: list, vectors: np.ndarray) -> int:
+        """Append vectors for feedIds not stored yet; returns the number of rows written"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(feed_ids), self.dim)
+        with self._lock, self._file_lock():
+            # Rows appended by other processes since the last load get their offsets first
+            self._load()
+            new = {}
+            for feed_id, vector in zip(feed_ids, vectors, strict=True):
+                key = str(feed_id)
+                if key not in self.rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return 0
+
+            matrix = np.stack(list(new.values()))
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+            # Vectors first: an id is only visible once its row is fully written
+            with open(self.vectors_path, "ab") as vectors_file:
+                first_row = vectors_file.seek(0, os.SEEK_END) // (4 * self.dim)
+                vectors_file.write(matrix.astype(np.float32).tobytes())
+            with open(self.ids_path, "a", encoding="utf-8") as ids_file:
+                ids_file.write("".join(f"{key}\n" for key in new))
+
+            for row, key in enumerate(new, start=first_row):
+                self.rows[key] = row
+                self.ids.append(key)
+            self._vectors = None
+            return len(new)
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: set | None = None, chunk_rows: int = 65536) -> list[tuple[str, float]]:
+        """
+        Brute-force cosine nearest neighbours of a query vector, as (feedId, similarity) pairs.
+        The memory map is scanned in chunks so the whole matrix never needs to be resident.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        exclude = {str(feed_id) for feed_id in exclude or ()}
+
+        vectors = self.vectors
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(vectors), chunk_rows):
+            scores = vectors[start : start + chunk_rows] @ query
+            rows = np.arange(start, start + len(scores))
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+
+            # Keep a few extra candidates so excluded rows do not shrink the result
+            keep = k + len(exclude)
+            if len(best_scores) > keep:
+                top = np.argpartition(-best_scores, keep)[:keep]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+
+        order = np.argsort(-best_scores)
+        results = [(self.ids[row], float(score)) for row, score in zip(best_rows[order], best_scores[order], strict=True) if self.ids[row] not in exclude]
+        return results[:k]
@@ -1,8 +1,58 @@
 import logging
 
-from pymongo import MongoClient
+import bson
+import zstandard
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from logging_config import LogSampler
+from metrics import MONGO_BATCH_SIZE, MONGO_OP_SECONDS, timed_mongo_operation
 
 logger = logging.getLogger(__name__)
+# Per-operation logs are sampled: writers in hot loops call these once per document or batch
+sampled_logger = LogSampler(logger)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Fields moved out of a stub (marked "archived": True) live in "<collection><COLD_SUFFIX>"
+COLD_SUFFIX = "_cold"
+
+# Archived ids per cold collection query, keeping the $in and the decompressed blobs bounded
+REHYDRATE_BATCH_SIZE = 1000
+
+
+def pack_cold_fields(fields: dict) -> bytes:
+    """BSON-encode and zstd-compress the fields moved to cold storage"""
+    return zstandard.ZstdCompressor(level=10).compress(bson.encode(fields))
+
+
+def unpack_cold_fields(data: bytes) -> dict:
+    return bson.decode(zstandard.ZstdDecompressor().decompress(data))
+
+
+def _rehydration_projection(projection: dict | None) -> tuple[dict | None, list[str]]:
+    """
+    Add the fields rehydration needs (_id and the archived marker) to a projection; returns
+    (projection, fields to drop from the results)
+    """
+    if not projection:
+        return projection, []
+    projection, added = dict(projection), []
+    if projection.get("_id", 1) == 0:
+        del projection["_id"]
+        added.append("_id")
+    if "archived" not in projection and any(value for field, value in projection.items() if field != "_id"):
+        projection["archived"] = 1
+        added.append("archived")
+    return projection or None, added
+
+
+def _projected(field: str, projection: dict | None) -> bool:
+    if not projection:
+        return True
+    if any(value for name, value in projection.items() if name != "_id"):
+        return bool(projection.get(field))
+    return projection.get(field, 1) != 0
 
 
 class MongoManagerDAO:
@@ -10,6 +60,11 @@ class MongoManagerDAO:
         self.client = MongoClient(uri)
         self.db = self.client[db_name]
 
+    def ping(self):
+        """Force the connection to the server (MongoClient connects lazily)"""
+        return self.client.admin.command("ping")
+
+    @timed_mongo_operation("insert_dataframe")
     def insert_dataframe(self, df, collection_name: str):
         """Insert a DataFrame into specified MongoDB collection"""
         collection = self.db[collection_name]
@@ -21,26 +76,43 @@ class MongoManagerDAO:
         else:
             print("⚠️ No records to insert.")
 
-    def insert_list(self, records: list[dict], collection_name: str):
+    @timed_mongo_operation("insert_list")
+    def insert_list(self, records: list[dict], collection_name: str) -> list[dict]:
         """
         Insert a list of dictionaries into MongoDB collection.
         Avoids duplicates based on the 'link' field.
+        Returns the newly inserted records (with their _id).
         """
         collection = self.db[collection_name]
-        logger.info(f"Ready to insert {len(records)} records into MongoDB collection '{collection_name}'")
+        sampled_logger.info(f"Ready to insert {len(records)} records into MongoDB collection '{collection_name}'", key=("insert_list", collection_name))
 
         if records:
+            MONGO_BATCH_SIZE.observe(len(records), operation="insert_list", collection=collection_name)
             # Avoid duplicates by 'link'
-            new_records = [r for r in records if not collection.find_one({"link": r.get("link")})]
+            existing_links = {document.get("link") for document in collection.find({"link": {"$in": [r.get("link") for r in records]}}, {"link": 1})}
+            new_records = [r for r in records if r.get("link") not in existing_links]
 
             if new_records:
-                result = collection.insert_many(new_records)
-                logger.info(f"Inserted {len(result.inserted_ids)} new records into MongoDB.")
+                try:
+                    collection.insert_many(new_records, ordered=False)
+                except BulkWriteError as e:
+                    # With a unique 'link' index, records inserted concurrently by another run (or repeated
+                    # in this batch) are rejected as duplicates; any other write error is raised
+                    write_errors = e.details.get("writeErrors", [])
+                    if any(error["code"] != DUPLICATE_KEY_ERROR for error in write_errors):
+                        raise
+                    rejected = {error["index"] for error in write_errors}
+                    new_records = [record for index, record in enumerate(new_records) if index not in rejected]
+                    logger.warning(f"Skipped {len(rejected)} records inserted concurrently into '{collection_name}'")
+                sampled_logger.info(f"Inserted {len(new_records)} new records into MongoDB.", key=("insert_list_done", collection_name))
+                return new_records
             else:
                 logger.warning("All records already exist.")
         else:
             logger.warning("No records to insert.")
+        return []
 
+    @timed_mongo_operation("insert_one")
     def insert_one(self, document: dict, collection_name: str):
         """
         Insert a single document into specified MongoDB collection.
@@ -53,22 +125,99 @@ class MongoManagerDAO:
             document["_id"] = ObjectId()
 
         result = collection.insert_one(document)
-        logger.info(f"Inserted single document with _id: {result.inserted_id} into collection '{collection_name}'")
+        sampled_logger.info(f"Inserted single document with _id: {result.inserted_id} into collection '{collection_name}'", key=("insert_one", collection_name))
         return result.inserted_id
 
+    @timed_mongo_operation("insert_many")
+    def insert_many(self, documents: list[dict], collection_name: str):
+        """
+        Insert a list of documents into specified MongoDB collection without duplicate checks.
+        Returns the inserted documents' _ids.
+        """
+        if not documents:
+            return []
+
+        MONGO_BATCH_SIZE.observe(len(documents), operation="insert_many", collection=collection_name)
+        collection = self.db[collection_name]
+        result = collection.insert_many(documents, ordered=False)
+        sampled_logger.info(f"Inserted {len(result.inserted_ids)} documents into collection '{collection_name}'", key=("insert_many", collection_name))
+        return result.inserted_ids
+
+    @timed_mongo_operation("find_one")
     def find_one(self, query: dict, collection_name: str) -> dict | None:
         """Find one document in specified collection"""
         collection = self.db[collection_name]
-        return collection.find_one(query)
+        document = collection.find_one(query)
+        if document and document.get("archived"):
+            self._rehydrate([document], collection_name)
+        return document
 
-    def find(self, query: dict, collection_name: str, sort: list | None = None):
-        """Find documents in specified collection"""
+    @timed_mongo_operation("find")
+    def find(
+        self, query: dict, collection_name: str, sort: list | None = None, projection: dict | None = None, limit: int | None = None, rehydrate: bool = True
+    ):
+        """
+        Find documents in specified collection.
+        Archived stubs get their cold fields back unless rehydrate=False.
+        """
         collection = self.db[collection_name]
-        cursor = collection.find(query)
+        query_projection, added_fields = _rehydration_projection(projection) if rehydrate else (projection, [])
+        cursor = collection.find(query, query_projection)
         if sort:
             cursor = cursor.sort(sort)
-        return list(cursor)
+        if limit:
+            cursor = cursor.limit(limit)
+        documents = list(cursor)
+
+        if rehydrate:
+            self._rehydrate(documents, collection_name, projection)
+            for document in documents:
+                for field in added_fields:
+                    document.pop(field, None)
+        return documents
+
+    def _rehydrate(self, documents: list[dict], collection_name: str, projection: dict | None = None):
+        """
+        Merge the fields moved to cold storage back into archived stubs, in place; hot values win.
+        Cold records are read and decompressed REHYDRATE_BATCH_SIZE at a time.
+        """
+        archived = {document["_id"]: document for document in documents if document.get("archived")}
+        archived_ids = list(archived)
+        cold_collection = self.db[f"{collection_name}{COLD_SUFFIX}"]
+        for start in range(0, len(archived_ids), REHYDRATE_BATCH_SIZE):
+            with MONGO_OP_SECONDS.time(operation="rehydrate", collection=collection_name):
+                cold_records = list(cold_collection.find({"_id": {"$in": archived_ids[start : start + REHYDRATE_BATCH_SIZE]}}))
+            for cold in cold_records:
+                document = archived[cold["_id"]]
+                for field, value in unpack_cold_fields(cold["data"]).items():
+                    if _projected(field, projection):
+                        document.setdefault(field, value)
+
+    def find_pages(self, query: dict, collection_name: str, page_size: int, projection: dict | None = None, limit: int | None = None):
+        """
+        Yield the documents matching query as lists of up to page_size, in _id order, fetching
+        one page per find so large result sets are never materialized at once
+        """
+        last_id = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+            page_limit = page_size if remaining is None else min(page_size, remaining)
+            page = self.find(page_query, collection_name, sort=[("_id", 1)], projection=projection, limit=page_limit)
+            if not page:
+                return
+            yield page
+            last_id = page[-1]["_id"]
+            if remaining is not None:
+                remaining -= len(page)
+
+    @timed_mongo_operation("distinct")
+    def distinct(self, field: str, collection_name: str, query: dict | None = None) -> list:
+        """Return distinct values of a field in specified collection"""
+        collection = self.db[collection_name]
+        return collection.distinct(field, query or {})
 
+    @timed_mongo_operation("delete_many")
     def delete_many(self, query: dict, collection_name: str):
         """Delete multiple documents from specified collection"""
         collection = self.db[collection_name]
@@ -76,8 +225,74 @@ class MongoManagerDAO:
         logger.info(f"Deleted {result.deleted_count} documents from collection '{collection_name}'")
         return result.deleted_count
 
+    @timed_mongo_operation("update_one")
     def update_one(self, query: dict, update: dict, collection_name: str):
         """Update one document in specified collection"""
         collection = self.db[collection_name]
         result = collection.update_one(query, update)
         return result
+
+    @timed_mongo_operation("update_many")
+    def update_many(self, query: dict, update: dict, collection_name: str):
+        """Update multiple documents in specified collection"""
+        collection = self.db[collection_name]
+        result = collection.update_many(query, update)
+        return result
+
+    @timed_mongo_operation("find_one_and_update")
+    def find_one_and_update(self, query: dict, update: dict, collection_name: str, sort: list | None = None, upsert: bool = False) -> dict | None:
+        """Atomically update the first matching document and return it as it is after the update"""
+        collection = self.db[collection_name]
+        return collection.find_one_and_update(query, update, sort=sort, upsert=upsert, return_document=ReturnDocument.AFTER)
+
+    @timed_mongo_operation("count_documents")
+    def count_documents(self, query: dict, collection_name: str) -> int:
+        """Count documents matching query in specified collection"""
+        collection = self.db[collection_name]
+        return collection.count_documents(query)
+
+    @timed_mongo_operation("bulk_upsert")
+    def bulk_upsert(self, records: list[dict], key_fields: list[str], collection_name: str):
+        """
+        Upsert a list of dictionaries in a single bulk write.
+        Each record replaces the fields of the document matching its key_fields.
+        """
+        if not records:
+            return None
+
+        MONGO_BATCH_SIZE.observe(len(records), operation="bulk_upsert", collection=collection_name)
+        collection = self.db[collection_name]
+        operations = [UpdateOne({field: record[field] for field in key_fields}, {"$set": record}, upsert=True) for record in records]
+        result = collection.bulk_write(operations, ordered=False)
+        sampled_logger.info(
+            f"Bulk upsert into '{collection_name}': {result.upserted_count} inserted, {result.modified_count} modified ({len(records)} records)",
+            key=("bulk_upsert", collection_name),
+        )
+        return result
+
+    @timed_mongo_operation("bulk_write")
+    def bulk_write(self, operations: list, collection_name: str):
+        """Run a list of pymongo write operations in a single unordered bulk write"""
+        if not operations:
+            return None
+        MONGO_BATCH_SIZE.observe(len(operations), operation="bulk_write", collection=collection_name)
+        collection = self.db[collection_name]
+        return collection.bulk_write(operations, ordered=False)
+
+    @timed_mongo_operation("aggregate")
+    def aggregate(self, pipeline: list, collection_name: str) -> list:
+        """Run an aggregation pipeline on specified collection"""
+        collection = self.db[collection_name]
+        return list(collection.aggregate(pipeline))
+
+    def create_index(self, keys: list, collection_name: str, unique: bool = False, partial_filter: dict | None = None):
+        """Create an index on specified collection (no-op if it already exists)"""
+        collection = self.db[collection_name]
+        if partial_filter:
+            return collection.create_index(keys, unique=unique, partialFilterExpression=partial_filter)
+        return collection.create_index(keys, unique=unique)
+
+    def watch(self, collection_name: str, pipeline: list | None = None, resume_after: dict | None = None, max_await_time_ms: int = 1000):
+        """Open a change stream on specified collection (requires a replica set)"""
+        collection = self.db[collection_name]
+        return collection.watch(pipeline or [], resume_after=resume_after, max_await_time_ms=max_await_time_ms)
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+import gridfs
+import zstandard
+
+from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import ITEMS_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION = "raw_feed_archive"
+BLOBS_BUCKET = "raw_feed_blobs"
+
+
+class RawArchiveDAO:
+    """
+    Archive of raw fetched feed payloads, zstd-compressed and deduplicated by sha256 of the
+    uncompressed bytes. Blobs live on local disk (<directory>/<sha[:2]>/<sha>.zst) or in the
+    'raw_feed_blobs' GridFS bucket; 'raw_feed_archive' holds one record per (source, sha256)
+    with the source metadata and first/last fetch times, so a payload served unchanged on
+    every fetch is stored once.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, backend: str = "local", directory: str = "raw_archive", level: int = 10):
+        if backend not in ("local", "gridfs"):
+            raise ValueError(f"Unknown raw archive backend '{backend}', expected 'local' or 'gridfs'")
+
+        self.mongo_manager = mongo_manager
+        self.backend = backend
+        self.directory = os.path.abspath(directory)
+        self.level = level
+        self._gridfs = gridfs.GridFS(mongo_manager.db, collection=BLOBS_BUCKET) if backend == "gridfs" else None
+        self.mongo_manager.create_index([("source", 1), ("sha256", 1)], ARCHIVE_COLLECTION, unique=True)
+        self.mongo_manager.create_index([("first_fetched_at", 1)], ARCHIVE_COLLECTION)
+
+    # ---------------- Blobs ----------------
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, sha256[:2], f"{sha256}.zst")
+
+    def _has_blob(self, sha256: str) -> bool:
+        if self._gridfs is not None:
+            return self._gridfs.exists(filename=sha256)
+        return os.path.exists(self._blob_path(sha256))
+
+    def _write_blob(self, sha256: str, compressed: bytes):
+        if self._gridfs is not None:
+            self._gridfs.put(compressed, filename=sha256)
+            return
+        path = self._blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as blob_file:
+            blob_file.write(compressed)
+        os.replace(temporary_path, path)
+
+    def _read_blob(self, sha256: str) -> bytes:
+        if self._gridfs is not None:
+            return self._gridfs.get_last_version(filename=sha256).read()
+        with open(self._blob_path(sha256), "rb") as blob_file:
+            return blob_file.read()
+
+    # ---------------- Archive ----------------
+
+    def store(self, payload: bytes, rss_feed: dict, fetched_at: datetime | None = None) -> dict:
+        """Archive one fetched payload of rss_feed and return its archive record"""
+        fetched_at = fetched_at or datetime.now()
+        sha256 = hashlib.sha256(payload).hexdigest()
+
+        if self._has_blob(sha256):
+            ITEMS_PROCESSED.inc(component="raw_archive", outcome="deduplicated")
+        else:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(payload)
+            self._write_blob(sha256, compressed)
+            ITEMS_PROCESSED.inc(component="raw_archive", outcome="stored")
+            logger.debug(f"Archived {len(payload)} bytes of {rss_feed['url']} as {len(compressed)} compressed bytes ({sha256})")
+
+        return self.mongo_manager.find_one_and_update(
+            {"source": rss_feed["url"], "sha256": sha256},
+            {
+                "$setOnInsert": {
+                    "sourceId": rss_feed["sourceId"],
+                    "source_name": rss_feed["name"],
+                    "size": len(payload),
+                    "backend": self.backend,
+                    "first_fetched_at": fetched_at,
+                },
+                "$set": {"last_fetched_at": fetched_at},
+                "$inc": {"fetch_count": 1},
+            },
+            ARCHIVE_COLLECTION,
+            upsert=True,
+        )
+
+    def load(self, sha256: str) -> bytes:
+        """Uncompressed payload archived under sha256"""
+        return zstandard.ZstdDecompressor().decompress(self._read_blob(sha256))
+
+    def records(self, query: dict | None = None) -> list[dict]:
+        """Archive records matching query, oldest first"""
+        return self.mongo_manager.find(query or {}, ARCHIVE_COLLECTION, sort=[("first_fetched_at", 1), ("_id", 1)])
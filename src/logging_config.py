@@ -1,7 +1,17 @@
+import atexit
+import json
+import logging
+import logging.config
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import threading
+import time
 
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+# "text" (default) or "json" for one JSON object per line in the log files
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -18,6 +28,7 @@ LOGGING_CONFIG = {
             "formatter": "detailed",
             "maxBytes": 10485760,  # 10MB
             "backupCount": 5,
+            "delay": True,  # The file is opened on the first record
         },
         "db_file": {
             "class": "logging.handlers.RotatingFileHandler",
@@ -25,6 +36,7 @@ LOGGING_CONFIG = {
             "formatter": "detailed",
             "maxBytes": 10485760,
             "backupCount": 5,
+            "delay": True,
         },
     },
     "loggers": {
@@ -41,3 +53,140 @@ LOGGING_CONFIG = {
         },
     },
 }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listeners = []
+_setup_lock = threading.Lock()
+_configured = False
+_worker_queue = None
+
+
+def setup_logging(config: dict = LOGGING_CONFIG):
+    """
+    Configure logging once per process. Handlers are built from config, then moved behind a
+    QueueHandler per logger and served by a QueueListener thread, so formatting and file I/O
+    happen off the calling thread. The log directory is created here rather than at import.
+    Does nothing in child processes, which must not open the parent's log files: they log
+    through setup_worker_logging instead.
+    """
+    global _configured
+    with _setup_lock:
+        if _configured or multiprocessing.parent_process() is not None:
+            return
+        _configured = True
+
+        os.makedirs(LOG_DIR, exist_ok=True)
+        if LOG_FORMAT == "json":
+            config = {
+                **config,
+                "formatters": {**config["formatters"], "json": {"()": JsonFormatter}},
+                "handlers": {name: {**handler, "formatter": "json"} if "filename" in handler else handler for name, handler in config["handlers"].items()},
+            }
+        logging.config.dictConfig(config)
+
+        for name in config.get("loggers", {}):
+            configured_logger = logging.getLogger(name or None)
+            handlers = list(configured_logger.handlers)
+            if not handlers:
+                continue
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            for handler in handlers:
+                configured_logger.removeHandler(handler)
+            configured_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            listener.start()
+            _listeners.append(listener)
+
+        atexit.register(stop_logging)
+
+
+class _RecordDispatcher:
+    """QueueListener target handing records of worker processes to the parent's logger of the same name"""
+
+    def handle(self, record: logging.LogRecord):
+        logging.getLogger(record.name).handle(record)
+
+
+def worker_log_queue(context=None):
+    """
+    Queue for spawned worker processes to log through (see setup_worker_logging), created on
+    first use with a listener that dispatches their records to this process's loggers
+    """
+    global _worker_queue
+    with _setup_lock:
+        if _worker_queue is None:
+            _worker_queue = (context or multiprocessing.get_context("spawn")).Queue()
+            listener = logging.handlers.QueueListener(_worker_queue, _RecordDispatcher())
+            listener.start()
+            _listeners.append(listener)
+        return _worker_queue
+
+
+def setup_worker_logging(log_queue, level: int = logging.INFO):
+    """Worker process initializer: send every record to the parent through log_queue, with no handlers of its own"""
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener threads"""
+    global _worker_queue
+    with _setup_lock:
+        # Listeners stop newest first, so worker records reach the queues before those close
+        _worker_queue = None
+        while _listeners:
+            _listeners.pop().stop()
+
+
+class LogSampler:
+    """
+    Rate limiter for messages emitted per item in hot loops: each key is logged at most once
+    every interval_seconds, and the next emitted message reports how many were suppressed.
+    """
+
+    def __init__(self, logger: logging.Logger, interval_seconds: float = 5.0):
+        self.logger = logger
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def log(self, level: int, message: str, key=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        key = key if key is not None else message
+        now = time.monotonic()
+        with self._lock:
+            last_time, suppressed = self._state.get(key, (None, 0))
+            if last_time is not None and now - last_time < self.interval_seconds:
+                self._state[key] = (last_time, suppressed + 1)
+                return
+            self._state[key] = (now, 0)
+        if suppressed:
+            message = f"{message} (+{suppressed} similar messages suppressed)"
+        self.logger.log(level, message)
+
+    def info(self, message: str, key=None):
+        self.log(logging.INFO, message, key)
+
+    def warning(self, message: str, key=None):
+        self.log(logging.WARNING, message, key)
@@ -1,66 +1,188 @@
-import logging.config
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
 from datetime import datetime
 
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+import numpy as np
+from pymongo.errors import OperationFailure
 
-from config import MONGO_DB_NAME, MONGO_URI
+from config import MONGO_DB_NAME, MONGO_URI, PREDICTION_CACHE_ENABLED, SENTIMENT_BACKEND, SENTIMENT_BATCH_SIZE, SENTIMENT_NUM_THREADS, SENTIMENT_WORKERS
 from dao.mongo_manager_dao import MongoManagerDAO
-from logging_config import LOGGING_CONFIG
+from logging_config import setup_logging, setup_worker_logging, worker_log_queue
+from metrics import INFERENCE_BATCH_SECONDS, INFERENCE_BATCH_SIZE, ITEMS_PROCESSED, REGISTRY, run_metrics
+from services.analysis_backfill_service import AnalysisBackfillTracker
+from services.analysis_text import ANALYSIS_PROJECTION, analysis_text_cache_key, backfill_analysis_text, build_analysis_text
+from services.prediction_cache import PredictionCache, text_hash
 
-logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
+# Feeds scored and written per round trip in process_rss_feeds
+FEEDS_CHUNK_SIZE = 256
+
+# Leading characters of analysis_text scored per feed
+SENTIMENT_TEXT_CHARS = 1000
+
+
+def find_best_model(mongo_manager) -> dict:
+    """Find the best fine-tuned model metadata"""
+    # Si solo querés UN documento, usá find_one sin sort
+    best_model = mongo_manager.find_one({"fine_tuned_from": "robertuito-base"}, "sentiment_model_metadata")
+
+    if not best_model:
+        raise ValueError("No fine-tuned BETO model found")
+
+    # Si necesitás el más reciente, entonces SÍ necesitás find + sort + limit
+    # Pero si con find_one te basta, dejalo así
+
+    return best_model
+
+
+def pending_feeds_query(model_id, incremental: bool = True, backfill: bool = True) -> dict:
+    """Query selecting the feeds to score with model_id"""
+    if not incremental:
+        return {}
+    return {"sentiment_model_id": {"$ne": model_id}} if backfill else {"sentiment_model_id": {"$exists": False}}
+
 
 class SentimentPredictor:
-    def __init__(self, mongo_manager_dao):
+    def __init__(
+        self,
+        mongo_manager_dao,
+        batch_size: int = SENTIMENT_BATCH_SIZE,
+        num_threads: int = SENTIMENT_NUM_THREADS,
+        backend: str = SENTIMENT_BACKEND,
+        model_info: dict | None = None,
+        use_cache: bool = PREDICTION_CACHE_ENABLED,
+    ):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown sentiment backend '{backend}', expected 'torch' or 'onnx'")
+
         self.mongo_manager = mongo_manager_dao
-        self.model, self.tokenizer, self.model_info = self._load_best_model()
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.backend = backend
+        self.model_info = model_info or find_best_model(self.mongo_manager)
+        self.cache = PredictionCache(self.mongo_manager, "sentiment", self._cache_model_key()) if use_cache else None
+
+        # Heavy imports and model deserialization are deferred to the first inference (see load)
+        self.model = None
+        self.tokenizer = None
+        self.sentiment_pipeline = None
+        self.timings = {"heavy_imports": 0.0, "model_load": 0.0}
+        self._load_lock = threading.Lock()
 
         self.emoji_map = {"positive": "📈✅", "negative": "📉❌", "neutral": "➖⚪"}
+        self._indexes_ready = False
+
+    def _cache_model_key(self) -> str:
+        """
+        Prediction cache key of the model as served by this backend: torch and ONNX (fp32 or int8)
+        outputs differ slightly, so they must not be served for each other
+        """
+        if self.backend != "onnx":
+            return f"{self.model_info['model_id']}:torch"
+        onnx_model_path = self.model_info.get("onnx_model_path") or ""
+        # The file name tells fp32 from int8 exports; the mtime separates re-exports
+        onnx_mtime = os.stat(onnx_model_path).st_mtime_ns if os.path.exists(onnx_model_path) else 0
+        return f"{self.model_info['model_id']}:onnx:{os.path.basename(onnx_model_path)}:{onnx_mtime}"
+
+    def load(self):
+        """Import the inference libraries and load the model, once (safe to call from several threads)"""
+        with self._load_lock:
+            if self.model is not None:
+                return
+
+            import_start = time.perf_counter()
+            if self.backend == "onnx":
+                import onnxruntime  # noqa: F401
+            else:
+                import torch  # noqa: F401
+            from transformers import AutoTokenizer  # noqa: F401
+
+            self.timings["heavy_imports"] = time.perf_counter() - import_start
+
+            load_start = time.perf_counter()
+            self.model, self.tokenizer = self._load_best_model()
+
+            # One long-lived pipeline (torch) or inference session (onnx), reused for every batch
+            if self.backend == "torch":
+                import torch
+                from transformers import pipeline
+
+                torch.set_num_threads(self.num_threads)
+                self.sentiment_pipeline = pipeline(
+                    "sentiment-analysis",
+                    model=self.model,
+                    tokenizer=self.tokenizer,
+                    return_all_scores=True,  # All probabilities
+                    device=0 if torch.backends.mps.is_built() else -1,
+                )
+            self.timings["model_load"] = time.perf_counter() - load_start
 
     def _load_best_model(self):
-        """Load the best fine-tuned BETO model"""
-        # Si solo querés UN documento, usá find_one sin sort
-        best_model = self.mongo_manager.find_one({"fine_tuned_from": "robertuito-base"}, "sentiment_model_metadata")
+        """Load the best fine-tuned model with the configured backend"""
+        from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
 
-        if not best_model:
-            raise ValueError("No fine-tuned BETO model found")
+        model_path = self.model_info["model_path"]
+        logger.info(f"Loading best model: {self.model_info['model_name']} ({self.backend})")
 
-        # Si necesitás el más reciente, entonces SÍ necesitás find + sort + limit
-        # Pero si con find_one te basta, dejalo así
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
 
-        model_path = best_model["model_path"]
-        logger.info(f"Loading best model: {best_model['model_name']}")
+        if self.backend == "onnx":
+            onnx_model_path = self.model_info.get("onnx_model_path")
+            if not onnx_model_path:
+                raise ValueError(f"No ONNX export for model {self.model_info['model_name']}, run mains.main_export_sentiment_model_onnx first")
 
-        model = AutoModelForSequenceClassification.from_pretrained(model_path)
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = self.num_threads
+            session = onnxruntime.InferenceSession(onnx_model_path, session_options, providers=["CPUExecutionProvider"])
+            self.id2label = AutoConfig.from_pretrained(model_path).id2label
+            return session, tokenizer
 
-        return model, tokenizer, best_model
+        # safetensors checkpoints are memory-mapped instead of read and copied into a fresh model
+        has_safetensors = os.path.exists(os.path.join(model_path, "model.safetensors"))
+        model = AutoModelForSequenceClassification.from_pretrained(model_path, use_safetensors=has_safetensors or None, low_cpu_mem_usage=True)
+        return model, tokenizer
 
     def _prepare_text(self, item):
-        """Prepare text by concatenating title, description and content"""
-        title = item.get("title", "")
-        description = item.get("description", "")
-        summary = item.get("summary", "")
-        content = item.get("content", "")
+        """Text scored for a feed: the analysis_text computed at ingest"""
+        text = item.get("analysis_text")
+        if text is None:
+            text = build_analysis_text(item)
+        return text[:SENTIMENT_TEXT_CHARS]
 
-        # Join with periods to separate sentences
-        full_text = f"{title}. {description}. {content}. {summary}"
+    def _classify_batch(self, texts: list[str]) -> list[list[dict]]:
+        """Run the model over a batch of texts, returning all label scores per text"""
+        self.load()
+        if self.backend == "onnx":
+            return self._classify_batch_onnx(texts)
 
-        return full_text[:1000]  # Max 1000 characters
+        import torch
 
-    def predict_sentiment(self, text):
-        """Make prediction with all probabilities"""
-        sentiment_pipeline = pipeline(
-            "sentiment-analysis",
-            model=self.model,
-            tokenizer=self.tokenizer,
-            return_all_scores=True,  # All probabilities
-            device=0 if torch.backends.mps.is_built() else -1,
-        )
+        with torch.inference_mode():
+            return self.sentiment_pipeline(texts, batch_size=len(texts), truncation=True)
+
+    def _classify_batch_onnx(self, texts: list[str]) -> list[list[dict]]:
+        """Same output as the sentiment pipeline, computed with ONNX Runtime"""
+        encoded = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        input_names = [model_input.name for model_input in self.model.get_inputs()]
+        logits = self.model.run(None, {name: encoded[name] for name in input_names})[0]
+
+        # Softmax over labels, as the pipeline does for single-label classification
+        exp_logits = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probabilities = exp_logits / exp_logits.sum(axis=-1, keepdims=True)
 
-        result = sentiment_pipeline(text[:512])[0]
+        return [[{"label": self.id2label[i], "score": float(score)} for i, score in enumerate(row)] for row in probabilities]
 
+    def _format_prediction(self, result: list[dict]) -> dict:
+        """Build the prediction dict from the pipeline scores of one text"""
         # Find prediction with highest probability
         best_pred = max(result, key=lambda x: x["score"])
 
@@ -77,35 +199,79 @@ class SentimentPredictor:
             "display_text": f"{emoji} {best_pred['label'].upper()} ({best_pred['score']:.1%})",
         }
 
-    def process_rss_feeds(self, limit=None):
-        """Process all RSS feeds and save predictions"""
-        logger.info("Starting sentiment prediction for RSS feeds")
-
-        # Get RSS feeds
-        query = {}
-        if limit:
-            feeds = self.mongo_manager.find(query, "rss_feeds_data", limit=limit)
-        else:
-            feeds = self.mongo_manager.find(query, "rss_feeds_data")
-
-        logger.info(f"Feeds to process: {len(feeds)}")
-
-        processed_count = 0
-        results = []
-
-        for feed in feeds:
-            try:
-                # Prepare text
-                text = self._prepare_text(feed)
-
-                if not text.strip():
-                    continue
+    def predict_sentiments(self, texts: list[str]) -> list[dict]:
+        """
+        Make predictions for many texts.
+        Texts are sorted by length and split into batches so each batch pads to similar lengths;
+        predictions are returned in the original order.
+        """
+        texts = [text[:512] for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        predictions = [None] * len(texts)
+
+        if texts:
+            self.load()
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start : start + self.batch_size]
+            with INFERENCE_BATCH_SECONDS.time(component="sentiment", backend=self.backend):
+                results = self._classify_batch([texts[i] for i in bucket])
+            INFERENCE_BATCH_SIZE.observe(len(bucket), component="sentiment", backend=self.backend)
+            for i, result in zip(bucket, results, strict=True):
+                predictions[i] = self._format_prediction(result)
+
+        return predictions
+
+    def predict_sentiments_cached(self, texts: list[str], cache_keys: list[str] | None = None) -> list[dict]:
+        """
+        Make predictions, running the model only for texts not found in the prediction cache.
+        cache_keys identify the texts (see analysis_text_cache_key); by default they are hashed here.
+        """
+        if not self.cache:
+            return self.predict_sentiments(texts)
+
+        hashes = cache_keys or [text_hash(text) for text in texts]
+        cached = self.cache.get_many(hashes)
+
+        # Duplicated texts in the same batch are only scored once
+        missing = {key: text for key, text in zip(hashes, texts, strict=True) if key not in cached}
+        computed = dict(zip(missing, self.predict_sentiments(list(missing.values())), strict=True))
+        self.cache.put_many(computed)
+
+        return [cached[key] if key in cached else computed[key] for key in hashes]
 
-                # Make prediction
-                prediction = self.predict_sentiment(text)
+    def predict_sentiment(self, text):
+        """Make prediction with all probabilities"""
+        return self.predict_sentiments([text])[0]
+
+    def _ensure_indexes(self):
+        """Indexes backing the incremental selection and the (feedId, model_used) upserts"""
+        if self._indexes_ready:
+            return
+        self.mongo_manager.create_index([("sentiment_model_id", 1)], "rss_feeds_data")
+        try:
+            self.mongo_manager.create_index([("feedId", 1), ("model_used", 1)], "feed_sentiment_analysis", unique=True)
+        except OperationFailure as e:
+            # Duplicates left by older insert-only runs prevent the unique index
+            logger.warning(f"Could not create unique (feedId, model_used) index, using a regular one: {e}")
+            self.mongo_manager.create_index([("feedId", 1), ("model_used", 1)], "feed_sentiment_analysis")
+        self._indexes_ready = True
+
+    def score_feeds(self, feeds: list[dict]) -> list[dict]:
+        """Predict sentiment for a list of feeds and build their analysis documents"""
+        # Prepare texts
+        pending = [(feed, self._prepare_text(feed)) for feed in feeds]
+        pending = [(feed, text) for feed, text in pending if text.strip()]
+
+        # Make predictions in batches
+        predictions = self.predict_sentiments_cached(
+            [text for _, text in pending], [analysis_text_cache_key(feed, SENTIMENT_TEXT_CHARS) for feed, _ in pending]
+        )
 
-                # Prepare document to save
-                analysis_doc = {
+        # Prepare documents to save
+        analysis_docs = []
+        for (feed, text), prediction in zip(pending, predictions, strict=True):
+            analysis_docs.append(
+                {
                     "feedId": feed["_id"],
                     "model_used": self.model_info["model_id"],
                     "model_name": self.model_info["model_name"],
@@ -118,27 +284,116 @@ class SentimentPredictor:
                     "source": feed.get("source", ""),
                     "pubDate": feed.get("pubDate", ""),
                 }
+            )
+
+        return analysis_docs
+
+    def save_analyses(self, analysis_docs: list[dict], feeds: list[dict]):
+        """
+        Upsert analysis documents keyed on (feedId, model_used) and mark the feeds as
+        scored by the current model, including feeds skipped for lack of text.
+        """
+        self.mongo_manager.bulk_upsert(analysis_docs, ["feedId", "model_used"], "feed_sentiment_analysis")
+        ITEMS_PROCESSED.inc(len(analysis_docs), component="sentiment", outcome="analyzed")
+        ITEMS_PROCESSED.inc(len(feeds) - len(analysis_docs), component="sentiment", outcome="skipped")
+        self.mongo_manager.update_many(
+            {"_id": {"$in": [feed["_id"] for feed in feeds]}},
+            {"$set": {"sentiment_model_id": self.model_info["model_id"]}},
+            "rss_feeds_data",
+        )
 
-                # Save to MongoDB
-                self.mongo_manager.insert_one(analysis_doc, "feed_sentiment_analysis")
+    def process_batch(self, feeds: list[dict]) -> list[dict]:
+        """Score and save a micro-batch of feeds (used by the streaming analysis mode)"""
+        self._ensure_indexes()
+        analysis_docs = self.score_feeds(feeds)
+        self.save_analyses(analysis_docs, feeds)
+        return analysis_docs
+
+    def process_rss_feeds(
+        self, limit=None, incremental=True, backfill=True, id_range=None, progress_callback=None, track_backfill=True, raise_on_failure=False
+    ):
+        """
+        Process RSS feeds and save predictions.
+        In incremental mode only feeds not yet scored by the current model are selected;
+        feeds scored by a previous model are re-scored as a tracked backfill unless backfill=False.
+        id_range restricts processing to an inclusive (first_id, last_id) shard, and
+        progress_callback(processed, backfilled) is called after every saved chunk.
+        Failed chunks are logged and skipped, or raised once all chunks ran if raise_on_failure.
+        """
+        logger.info("Starting sentiment prediction for RSS feeds")
+        model_id = self.model_info["model_id"]
+        self._ensure_indexes()
 
-                results.append(analysis_doc)
-                processed_count += 1
+        # Get RSS feeds
+        query = pending_feeds_query(model_id, incremental, backfill)
+        if id_range:
+            query["_id"] = {"$gte": id_range[0], "$lte": id_range[1]}
+
+        backfill_tracker = None
+        if incremental and backfill and track_backfill:
+            stale_count = self.mongo_manager.count_documents({"sentiment_model_id": {"$exists": True, "$ne": model_id}}, "rss_feeds_data")
+            if stale_count:
+                backfill_tracker = AnalysisBackfillTracker(self.mongo_manager, "sentiment", model_id)
+                backfill_tracker.start(stale_count)
+
+        # Only the canonical text is fetched, so items collected before it existed get it first
+        if not id_range:
+            backfill_analysis_text(self.mongo_manager)
+        total = self.mongo_manager.count_documents(query, "rss_feeds_data")
+        total = min(total, limit) if limit else total
+
+        logger.info(f"Feeds to process: {total}")
+        if not total:
+            return []
+
+        processed_count = 0
+        failed_chunks = 0
+        results = []
+
+        # Feeds are read one chunk at a time, in _id order
+        chunks = self.mongo_manager.find_pages(
+            query, "rss_feeds_data", FEEDS_CHUNK_SIZE, projection={**ANALYSIS_PROJECTION, "sentiment_model_id": 1}, limit=limit
+        )
+        feeds_read = 0
+        for chunk in chunks:
+            chunk_start = feeds_read
+            feeds_read += len(chunk)
+            try:
+                analysis_docs = self.score_feeds(chunk)
 
-                # Show progress every 10 feeds
-                if processed_count % 10 == 0:
-                    logger.info(f"Processed: {processed_count}/{len(feeds)}")
+                # Save to MongoDB
+                self.save_analyses(analysis_docs, chunk)
+                backfilled_count = sum(1 for feed in chunk if feed.get("sentiment_model_id"))
+                if backfill_tracker:
+                    backfill_tracker.advance(backfilled_count)
+                if progress_callback:
+                    progress_callback(len(analysis_docs), backfilled_count)
 
                 # Show some examples
-                if processed_count <= 3:
-                    logger.info(f"{prediction['sentiment_emoji']} '{feed.get('title', '')[:50]}...'")
-                    logger.info(f"→ {prediction['display_text']}")
-                    logger.info(f"Scores: {prediction['all_scores']}")
+                for doc in analysis_docs[: max(0, 3 - processed_count)]:
+                    logger.info(f"{doc['sentiment_emoji']} '{doc['text_preview'][:50]}...'")
+                    logger.info(f"→ {doc['sentiment_emoji']} {doc['sentiment_label'].upper()} ({doc['sentiment_confidence']:.1%})")
+                    logger.info(f"Scores: {doc['all_scores']}")
+
+                results.extend(analysis_docs)
+                processed_count += len(analysis_docs)
+
+                # Show progress every chunk
+                logger.info(f"Processed: {processed_count}/{total}")
 
             except Exception as e:
-                logger.error(f"Error processing feed {feed.get('_id', '')}: {e}")
+                failed_chunks += 1
+                ITEMS_PROCESSED.inc(len(chunk), component="sentiment", outcome="failed")
+                logger.error(f"Error processing feeds {chunk_start}-{chunk_start + len(chunk)}: {e}")
                 continue
 
+        if backfill_tracker and not failed_chunks and not limit:
+            backfill_tracker.finish()
+        if self.cache:
+            self.cache.log_stats()
+        if failed_chunks and raise_on_failure:
+            raise RuntimeError(f"{failed_chunks} chunks failed, {processed_count}/{total} feeds processed")
+
         # Show final summary
         sentiment_counts = {}
         for result in results:
@@ -156,20 +411,162 @@ class SentimentPredictor:
         return results
 
 
+# ---------------- Sharded scoring ----------------
+
+# Per worker process state, set once by _init_shard_worker
+_shard_predictor = None
+_shard_progress_queue = None
+
+
+def _init_shard_worker(backend: str, num_threads: int, progress_queue, log_queue):
+    """Load the model once per worker process, with its own Mongo client; logs go through the coordinator"""
+    global _shard_predictor, _shard_progress_queue
+    setup_worker_logging(log_queue)
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    _shard_predictor = SentimentPredictor(mongo_manager, num_threads=num_threads, backend=backend)
+    _shard_progress_queue = progress_queue
+
+
+def _score_shard(id_range: tuple, incremental: bool, backfill: bool) -> dict:
+    """Score one _id range in a worker process and return its counts"""
+    results = _shard_predictor.process_rss_feeds(
+        incremental=incremental,
+        backfill=backfill,
+        id_range=id_range,
+        progress_callback=lambda processed, backfilled: _shard_progress_queue.put((processed, backfilled)),
+        track_backfill=False,
+    )
+
+    sentiment_counts = {}
+    for result in results:
+        label = result["sentiment_label"]
+        sentiment_counts[label] = sentiment_counts.get(label, 0) + 1
+    # Metrics recorded in this process are reported by the coordinator's registry
+    return {"processed": len(results), "sentiment_counts": sentiment_counts, "metrics": REGISTRY.collect(reset=True)}
+
+
+class ShardedSentimentRunner:
+    """
+    Splits the pending feeds by _id range across worker processes.
+    Each worker loads the model once and gets cpu_count // workers torch threads,
+    while this coordinator merges progress, counts and backfill tracking.
+    """
+
+    def __init__(self, mongo_manager_dao, workers: int = SENTIMENT_WORKERS, backend: str = SENTIMENT_BACKEND):
+        self.mongo_manager = mongo_manager_dao
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+
+    def _shard_ranges(self, feed_ids: list) -> list[tuple]:
+        """Split sorted feed _ids into contiguous, evenly sized inclusive ranges"""
+        if not feed_ids:
+            return []
+
+        shard_count = min(self.workers, len(feed_ids))
+        bounds = [len(feed_ids) * i // shard_count for i in range(shard_count + 1)]
+        return [(feed_ids[bounds[i]], feed_ids[bounds[i + 1] - 1]) for i in range(shard_count)]
+
+    def run(self, incremental=True, backfill=True) -> dict:
+        """Score all pending feeds across the worker pool"""
+        model_id = find_best_model(self.mongo_manager)["model_id"]
+        query = pending_feeds_query(model_id, incremental, backfill)
+        backfill_analysis_text(self.mongo_manager)
+        feed_ids = [feed["_id"] for feed in self.mongo_manager.find(query, "rss_feeds_data", sort=[("_id", 1)], projection={"_id": 1})]
+        ranges = self._shard_ranges(feed_ids)
+        total = len(feed_ids)
+        logger.info(f"Feeds to process: {total} in {len(ranges)} shards ({self.threads_per_worker} threads per worker)")
+
+        summary = {"processed": 0, "failed_shards": 0, "sentiment_counts": {}}
+        if not ranges:
+            return summary
+
+        backfill_tracker = None
+        if incremental and backfill:
+            stale_count = self.mongo_manager.count_documents({"sentiment_model_id": {"$exists": True, "$ne": model_id}}, "rss_feeds_data")
+            if stale_count:
+                backfill_tracker = AnalysisBackfillTracker(self.mongo_manager, "sentiment", model_id)
+                backfill_tracker.start(stale_count)
+
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        progress = 0
+
+        def drain_progress():
+            nonlocal progress
+            while True:
+                try:
+                    processed, backfilled = progress_queue.get_nowait()
+                except queue.Empty:
+                    return
+                progress += processed
+                if backfill_tracker:
+                    backfill_tracker.advance(backfilled)
+
+        with ProcessPoolExecutor(
+            max_workers=len(ranges),
+            mp_context=context,
+            initializer=_init_shard_worker,
+            initargs=(self.backend, self.threads_per_worker, progress_queue, worker_log_queue(context)),
+        ) as executor:
+            futures = {executor.submit(_score_shard, id_range, incremental, backfill): id_range for id_range in ranges}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=5)
+                drain_progress()
+                logger.info(f"Processed: {progress}/{total}")
+
+                for future in done:
+                    try:
+                        shard_result = future.result()
+                    except Exception as e:
+                        summary["failed_shards"] += 1
+                        logger.error(f"Shard {futures[future]} failed: {e}")
+                        continue
+                    REGISTRY.merge(shard_result["metrics"])
+                    summary["processed"] += shard_result["processed"]
+                    for label, count in shard_result["sentiment_counts"].items():
+                        summary["sentiment_counts"][label] = summary["sentiment_counts"].get(label, 0) + count
+
+        drain_progress()
+        if backfill_tracker and not summary["failed_shards"]:
+            backfill_tracker.finish()
+
+        logger.info(f"Sharded prediction completed: {summary['processed']} processed, {summary['failed_shards']} failed shards")
+        logger.info(f"Sentiment distribution: {summary['sentiment_counts']}")
+        return summary
+
+
 def main():
     """Main function for RSS feed sentiment prediction"""
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Sentiment prediction for RSS feeds")
+    parser.add_argument("--full", action="store_true", help="Re-score every feed instead of only pending ones")
+    parser.add_argument("--no-backfill", action="store_true", help="Skip feeds scored by a previous model")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default=SENTIMENT_BACKEND, help="Inference backend")
+    parser.add_argument("--workers", type=int, default=SENTIMENT_WORKERS, help="Worker processes for sharded scoring")
+    args = parser.parse_args()
+
     logger.info("Starting sentiment prediction system")
 
     # MongoDB configuration with generic DAO
+    connect_start = time.perf_counter()
     mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
-
-    # Import torch for device detection
-    global torch
-    import torch
+    mongo_manager.ping()
+    db_connect_seconds = time.perf_counter() - connect_start
 
     # Execute prediction
-    predictor = SentimentPredictor(mongo_manager)
-    predictor.process_rss_feeds(limit=None)
+    with run_metrics("sentiment_analysis"):
+        if args.workers > 1:
+            runner = ShardedSentimentRunner(mongo_manager, workers=args.workers, backend=args.backend)
+            runner.run(incremental=not args.full, backfill=not args.no_backfill)
+        else:
+            predictor = SentimentPredictor(mongo_manager, backend=args.backend)
+            predictor.process_rss_feeds(limit=None, incremental=not args.full, backfill=not args.no_backfill)
+            logger.info(
+                f"Startup time: heavy imports {predictor.timings['heavy_imports']:.2f}s, "
+                f"DB connect {db_connect_seconds:.2f}s, model load {predictor.timings['model_load']:.2f}s"
+            )
 
     logger.info("Results saved in: feed_sentiment_analysis")
 
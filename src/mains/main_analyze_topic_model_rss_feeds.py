@@ -1,147 +1,442 @@
+import argparse
+import json
 import logging
-import logging.config
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import numpy as np
 import yake
+from bson import ObjectId
+from pymongo.errors import OperationFailure
 
-from config import MONGO_DB_NAME, MONGO_URI
+from config import EMBEDDINGS_DIR, KEYBERT_BATCH_SIZE, KEYBERT_MODEL, MONGO_DB_NAME, MONGO_URI, PREDICTION_CACHE_ENABLED, TOPIC_EXTRACTOR, TOPIC_WORKERS
+from dao.embedding_store_dao import EmbeddingStoreDAO
 from dao.mongo_manager_dao import MongoManagerDAO
-from logging_config import LOGGING_CONFIG
+from logging_config import LogSampler, setup_logging, setup_worker_logging, worker_log_queue
+from metrics import INFERENCE_BATCH_SECONDS, INFERENCE_BATCH_SIZE, ITEMS_PROCESSED, REGISTRY, run_metrics
+from services.analysis_backfill_service import AnalysisBackfillTracker
+from services.analysis_text import ANALYSIS_PROJECTION, analysis_text_cache_key, backfill_analysis_text, build_analysis_text
+from services.keyphrase_index_service import KeyphraseIndex
+from services.prediction_cache import PredictionCache, text_hash
 
-logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
+sampled_logger = LogSampler(logger)
+
+
+# Feeds analyzed and written per round trip in process_feeds
+FEEDS_CHUNK_SIZE = 256
+
+# Leading characters of analysis_text analyzed per feed
+TOPIC_TEXT_CHARS = 2000
+
+YAKE_CONFIG = {
+    "lan": "es",  # Spanish language
+    "n": 2,  # Max 3 words per keyphrase
+    "dedupLim": 0.2,  # Deduplication threshold
+    "top": 6,  # Top 10 keyphrases
+    "windowsSize": 5,  # Context window size
+}
+
+KEYBERT_CONFIG = {
+    "keyphrase_ngram_range": (1, 2),  # Same phrase length as YAKE
+    "use_mmr": True,  # Maximal Marginal Relevance for diverse keyphrases
+    "diversity": 0.5,
+    "top_n": 6,
+    "stop_words": None,  # The built-in list is English only
+}
+
+
+# ---------------- Parallel extraction ----------------
+
+# Per worker process extractor, set once by _init_yake_worker
+_worker_extractor = None
+
+
+def _init_yake_worker(extractor_config: dict, log_queue):
+    global _worker_extractor
+    setup_worker_logging(log_queue)
+    _worker_extractor = yake.KeywordExtractor(**extractor_config)
+
+
+def _extract_keywords_chunk(texts: list[str]) -> tuple[list[list], dict]:
+    """Extract keyphrases for a chunk of texts in a worker process, with the metrics it recorded"""
+    keywords = [[[phrase, float(score)] for phrase, score in _worker_extractor.extract_keywords(text)] for text in texts]
+    return keywords, REGISTRY.collect(reset=True)
 
 
 class SimpleTopicAnalyzer:
-    def __init__(self, mongo_manager_dao):
+    def __init__(
+        self,
+        mongo_manager_dao,
+        use_cache: bool = PREDICTION_CACHE_ENABLED,
+        workers: int = TOPIC_WORKERS,
+        extractor: str = TOPIC_EXTRACTOR,
+        keybert_model: str = KEYBERT_MODEL,
+    ):
+        if extractor not in ("yake", "keybert"):
+            raise ValueError(f"Unknown topic extractor '{extractor}', expected 'yake' or 'keybert'")
+
         self.mongo_manager = mongo_manager_dao
-        logger.info("Loading YAKE keyword extractor for Spanish...")
-        self.kw_extractor = yake.KeywordExtractor(
-            lan="es",  # Spanish language
-            n=2,  # Max 3 words per keyphrase
-            dedupLim=0.2,  # Deduplication threshold
-            top=6,  # Top 10 keyphrases
-            windowsSize=5,  # Context window size
-        )
+        self.extractor = extractor
+        self.executor = None
+        self.embedding_store = None
+
+        if extractor == "yake":
+            logger.info("Loading YAKE keyword extractor for Spanish...")
+            self.extractor_config = dict(YAKE_CONFIG)
+            self.kw_extractor = yake.KeywordExtractor(**self.extractor_config)
+            # YAKE is pure Python: with workers > 1 extraction runs in a process pool, one extractor per worker
+            self.workers = max(1, workers)
+        else:
+            self.extractor_config = {"model": keybert_model, **KEYBERT_CONFIG}
+            self._load_keybert(keybert_model)
+            # The encoder already uses every core through torch threads
+            self.workers = 1
+
+        # Identifies the extractor configuration in cached results
+        self.config_hash = text_hash(json.dumps({"extractor": extractor, **self.extractor_config}, sort_keys=True))[:16]
+        self.cache = PredictionCache(self.mongo_manager, "topic", self.config_hash) if use_cache else None
+        self.keyphrase_index = KeyphraseIndex(self.mongo_manager)
+        self._indexes_ready = False
+
+    def _load_keybert(self, model_name: str):
+        """Load the sentence embedding model and open its document embedding store"""
+        from keybert import KeyBERT
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Loading KeyBERT with embedding model {model_name}...")
+        self.embedding_model = SentenceTransformer(model_name)
+        self.kw_extractor = KeyBERT(model=self.embedding_model)
+
+        dim = self.embedding_model.get_sentence_embedding_dimension()
+        store_name = "feeds_" + text_hash(model_name)[:12]
+        self.embedding_store = EmbeddingStoreDAO(EMBEDDINGS_DIR, store_name, dim, metadata={"model": model_name})
+        logger.info(f"Embedding store {store_name}: {len(self.embedding_store)} stored document embeddings")
+
+    def _ensure_indexes(self):
+        """Indexes backing the incremental selection and the (feedId, config_hash) upserts"""
+        if self._indexes_ready:
+            return
+        self.mongo_manager.create_index([("topic_config_hash", 1)], "rss_feeds_data")
+        try:
+            self.mongo_manager.create_index([("feedId", 1), ("config_hash", 1)], "feed_topic_analysis", unique=True)
+        except OperationFailure as e:
+            logger.warning(f"Could not create unique (feedId, config_hash) index, using a regular one: {e}")
+            self.mongo_manager.create_index([("feedId", 1), ("config_hash", 1)], "feed_topic_analysis")
+        self._indexes_ready = True
 
     def _prepare_text(self, item):
-        """Prepare text by combining title, summary and content"""
-        title = item.get("title", "")
-        description = item.get("description", "")
-        summary = item.get("summary", "")
-        content = item.get("content", "").strip()
+        """Text analyzed for a feed: the analysis_text computed at ingest"""
+        text = item.get("analysis_text")
+        if text is None:
+            text = build_analysis_text(item)
+        return text[:TOPIC_TEXT_CHARS]
+
+    def _extract_keywords_many(self, texts: list[str], feed_ids: list | None = None, cache_keys: list[str] | None = None) -> list[list]:
+        """
+        Extract keyphrases for many texts, skipping extraction for texts found in the prediction cache.
+        cache_keys identify the texts (see analysis_text_cache_key); by default they are hashed here.
+        """
+        hashes = cache_keys or [text_hash(text) for text in texts]
+        cached = self.cache.get_many(hashes) if self.cache else {}
+
+        # Duplicated texts are only extracted once
+        missing = {key: index for index, key in enumerate(hashes) if key not in cached}
+        missing_texts = [texts[index] for index in missing.values()]
+        with INFERENCE_BATCH_SECONDS.time(component="topic", backend=self.extractor):
+            if self.extractor == "keybert":
+                missing_ids = [feed_ids[index] for index in missing.values()] if feed_ids else None
+                computed_keywords = self._extract_keywords_keybert(missing_texts, missing_ids)
+            else:
+                computed_keywords = self._extract_keywords_uncached(missing_texts)
+        INFERENCE_BATCH_SIZE.observe(len(missing_texts), component="topic", backend=self.extractor)
+        computed = dict(zip(missing, computed_keywords, strict=True))
+
+        if self.cache:
+            self.cache.put_many(computed)
+
+        return [cached[key] if key in cached else computed[key] for key in hashes]
+
+    def _extract_keywords_uncached(self, texts: list[str]) -> list[list]:
+        """Run YAKE over texts, in the worker pool when parallel mode is enabled"""
+        if self.workers == 1 or len(texts) < 2:
+            return [[[phrase, float(score)] for phrase, score in self.kw_extractor.extract_keywords(text)] for text in texts]
+
+        if self.executor is None:
+            context = multiprocessing.get_context("spawn")
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_yake_worker,
+                initargs=(self.extractor_config, worker_log_queue(context)),
+            )
+
+        # executor.map keeps the input order
+        chunk_size = max(1, -(-len(texts) // self.workers))
+        chunks = [texts[start : start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        keywords = []
+        for chunk_keywords, chunk_metrics in self.executor.map(_extract_keywords_chunk, chunks):
+            REGISTRY.merge(chunk_metrics)
+            keywords.extend(chunk_keywords)
+        return keywords
+
+    def document_embeddings(self, texts: list[str], feed_ids: list | None = None) -> np.ndarray:
+        """
+        Document embeddings for texts, encoding only the feeds missing from the embedding store.
+        Newly encoded embeddings are persisted, so every article is encoded once.
+        """
+        stored = self.embedding_store.get_many(feed_ids) if feed_ids else {}
+        pending = [index for index in range(len(texts)) if not feed_ids or feed_ids[index] not in stored]
+
+        embeddings = np.empty((len(texts), self.embedding_store.dim), dtype=np.float32)
+        for index, feed_id in enumerate(feed_ids or []):
+            if feed_id in stored:
+                embeddings[index] = stored[feed_id]
+
+        if pending:
+            encoded = self.embedding_model.encode([texts[index] for index in pending], batch_size=KEYBERT_BATCH_SIZE, normalize_embeddings=True)
+            embeddings[pending] = encoded
+            if feed_ids:
+                written = self.embedding_store.add_many([feed_ids[index] for index in pending], encoded)
+                logger.info(f"Encoded {len(pending)} documents, {written} new embeddings stored")
+
+        return embeddings
+
+    def _extract_keywords_keybert(self, texts: list[str], feed_ids: list | None = None) -> list[list]:
+        """Run KeyBERT over texts reusing stored document embeddings"""
+        if not texts:
+            return []
+        doc_embeddings = self.document_embeddings(texts, feed_ids)
+        keywords = self.kw_extractor.extract_keywords(texts, doc_embeddings=doc_embeddings, **KEYBERT_CONFIG)
+        # A single document returns a flat list
+        if len(texts) == 1:
+            keywords = [keywords]
+        return [[[phrase, float(score)] for phrase, score in text_keywords] for text_keywords in keywords]
+
+    def close(self):
+        """Shut down the worker pool, if any"""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _build_analysis(self, feed, text, keywords):
+        """Prepare analysis document - note: YAKE scores are LOWER is better, KeyBERT similarities HIGHER is better"""
+        return {
+            "feedId": feed["_id"],
+            "extractor": self.extractor,
+            "config_hash": self.config_hash,
+            "analysis_date": datetime.now(),
+            "keyphrases": [{"phrase": phrase, "score": float(score)} for phrase, score in keywords],
+            "text_preview": text[:500] + "..." if len(text) > 500 else text,
+            "source": feed.get("source", ""),
+            "title": feed.get("title", ""),
+            "pubDate": feed.get("pubDate", ""),
+            "processed_text_length": len(text),
+        }
+
+    def _has_enough_text(self, feed, text):
+        if not text.strip() or len(text.strip()) < 20:
+            sampled_logger.warning(f"Skipping feed with insufficient text: {feed.get('title', 'No title')}", key="insufficient_text")
+            return False
+        return True
+
+    def analyze_feeds(self, feeds):
+        """Analyze a list of feeds, returning analysis documents for feeds with enough text"""
+        pending = [(feed, self._prepare_text(feed)) for feed in feeds]
+        pending = [(feed, text) for feed, text in pending if self._has_enough_text(feed, text)]
+
+        texts = [text for _, text in pending]
+        feed_ids = [feed["_id"] for feed, _ in pending]
+        if self.extractor == "keybert":
+            # Embeddings are stored for every feed, including those whose keyphrases come from the cache
+            self.document_embeddings(texts, feed_ids)
+
+        keywords = self._extract_keywords_many(texts, feed_ids, [analysis_text_cache_key(feed, TOPIC_TEXT_CHARS) for feed, _ in pending])
+        return [self._build_analysis(feed, text, feed_keywords) for (feed, text), feed_keywords in zip(pending, keywords, strict=True)]
+
+    def save_analyses(self, analyses, feeds):
+        """
+        Upsert analysis documents keyed on (feedId, config_hash) and mark the feeds as
+        analyzed with the current extractor configuration, including feeds skipped for lack of text.
+        """
+        self.mongo_manager.bulk_upsert(analyses, ["feedId", "config_hash"], "feed_topic_analysis")
+        ITEMS_PROCESSED.inc(len(analyses), component="topic", outcome="analyzed")
+        ITEMS_PROCESSED.inc(len(feeds) - len(analyses), component="topic", outcome="skipped")
+        self.mongo_manager.update_many(
+            {"_id": {"$in": [feed["_id"] for feed in feeds]}},
+            {"$set": {"topic_config_hash": self.config_hash}},
+            "rss_feeds_data",
+        )
+        self.keyphrase_index.index_analyses(analyses)
 
-        # Join with periods to separate sentences
-        full_text = f"{title}. {description}. {content}. {summary}"
-        return full_text[:2000]  # Limit length for processing
+    def process_batch(self, feeds):
+        """Analyze and save a micro-batch of feeds (used by the streaming analysis mode)"""
+        self._ensure_indexes()
+        analyses = self.analyze_feeds(feeds)
+        self.save_analyses(analyses, feeds)
+        return analyses
 
     def analyze_feed(self, feed):
-        """Analyze a single feed and extract keyphrases using YAKE"""
+        """Analyze a single feed and extract keyphrases with the configured extractor"""
         try:
             text = self._prepare_text(feed)
 
-            if not text.strip() or len(text.strip()) < 20:
-                logger.warning(f"Skipping feed with insufficient text: {feed.get('title', 'No title')}")
+            if not self._has_enough_text(feed, text):
                 return None
 
             logger.debug(f"Processing text: {text[:100]}...")
 
-            # Extract keywords using YAKE
-            keywords = self.kw_extractor.extract_keywords(text)
+            # Extract keywords using the configured extractor
+            keywords = self._extract_keywords_many([text], [feed["_id"]], [analysis_text_cache_key(feed, TOPIC_TEXT_CHARS)])[0]
 
             # DEBUG: Log the raw keyphrases
             logger.debug(f"Raw keyphrases: {keywords}")
 
-            # Prepare analysis document - note: YAKE returns (phrase, score) where LOWER score is better
-            analysis_doc = {
-                "feedId": feed["_id"],
-                "analysis_date": datetime.now(),
-                "keyphrases": [{"phrase": phrase, "score": float(score)} for phrase, score in keywords],
-                "text_preview": text[:500] + "..." if len(text) > 500 else text,
-                "source": feed.get("source", ""),
-                "title": feed.get("title", ""),
-                "processed_text_length": len(text),
-            }
-
-            return analysis_doc
+            return self._build_analysis(feed, text, keywords)
 
         except Exception as e:
             logger.error(f"Error analyzing feed {feed.get('_id', '')}: {e}")
             return None
 
-    def process_feeds(self, limit=None):
-        """Process all RSS feeds and save topic analysis"""
-        logger.info("Starting automatic topic analysis for RSS feeds with YAKE")
+    def find_similar_feeds(self, feed_id, k: int = 10) -> list[dict]:
+        """Feeds whose stored document embeddings are closest to the one of feed_id (KeyBERT mode)"""
+        if self.embedding_store is None:
+            raise ValueError("Similarity search needs the keybert extractor")
+
+        self.embedding_store.refresh()
+        query = self.embedding_store.get_many([feed_id]).get(feed_id)
+        if query is None:
+            feed = self.mongo_manager.find_one({"_id": feed_id}, "rss_feeds_data")
+            if not feed:
+                raise ValueError(f"Feed {feed_id} not found")
+            query = self.document_embeddings([self._prepare_text(feed)], [feed_id])[0]
+
+        neighbours = self.embedding_store.search(query, k=k, exclude={feed_id})
+        return [{"feedId": ObjectId(neighbour_id), "similarity": similarity} for neighbour_id, similarity in neighbours]
+
+    def process_feeds(self, limit=None, incremental=True, backfill=False):
+        """
+        Process RSS feeds and save topic analysis.
+        In incremental mode only feeds never analyzed are selected; feeds analyzed with a
+        previous extractor configuration are re-analyzed only as an explicit, tracked backfill.
+        """
+        logger.info(f"Starting automatic topic analysis for RSS feeds with {self.extractor.upper()}")
+        self._ensure_indexes()
 
         # Get RSS feeds
         query = {}
-        if limit:
-            feeds = self.mongo_manager.find(query, "rss_feeds_data", limit=limit)
-        else:
-            feeds = self.mongo_manager.find(query, "rss_feeds_data")
-
-        logger.info(f"Feeds to analyze: {len(feeds)}")
+        backfill_tracker = None
+        if incremental:
+            stale_query = {"topic_config_hash": {"$exists": True, "$ne": self.config_hash}}
+            stale_count = self.mongo_manager.count_documents(stale_query, "rss_feeds_data")
+
+            if backfill:
+                query = {"topic_config_hash": {"$ne": self.config_hash}}
+                if stale_count:
+                    backfill_tracker = AnalysisBackfillTracker(self.mongo_manager, "topic", self.config_hash)
+                    backfill_tracker.start(stale_count)
+            else:
+                query = {"topic_config_hash": {"$exists": False}}
+                if stale_count:
+                    logger.warning(f"{stale_count} feeds were analyzed with a previous extractor configuration, run with --backfill to re-analyze them")
+
+        # Only the canonical text is fetched, so items collected before it existed get it first
+        backfill_analysis_text(self.mongo_manager)
+        total = self.mongo_manager.count_documents(query, "rss_feeds_data")
+        total = min(total, limit) if limit else total
+
+        logger.info(f"Feeds to analyze: {total}")
+        if not total:
+            return []
 
         processed_count = 0
         successful_count = 0
+        failed_chunks = 0
         results = []
 
-        for feed in feeds:
+        # Feeds are read one chunk at a time, in _id order; each worker gets about FEEDS_CHUNK_SIZE feeds per round trip
+        chunk_size = FEEDS_CHUNK_SIZE * self.workers
+        chunks = self.mongo_manager.find_pages(query, "rss_feeds_data", chunk_size, projection={**ANALYSIS_PROJECTION, "topic_config_hash": 1}, limit=limit)
+        feeds_read = 0
+        for chunk in chunks:
+            chunk_start = feeds_read
+            feeds_read += len(chunk)
             try:
-                processed_count += 1
+                processed_count += len(chunk)
 
-                # Analyze feed
-                analysis = self.analyze_feed(feed)
+                # Analyze feeds
+                analyses = self.analyze_feeds(chunk)
 
-                if analysis:
-                    # Save to MongoDB
-                    self.mongo_manager.insert_one(analysis, "feed_topic_analysis")
-                    results.append(analysis)
-                    successful_count += 1
-
-                # Show progress every 10 feeds
-                if processed_count % 10 == 0:
-                    logger.info(f"Processed: {processed_count}/{len(feeds)}")
+                # Save to MongoDB
+                self.save_analyses(analyses, chunk)
+                if backfill_tracker:
+                    backfill_tracker.advance(sum(1 for feed in chunk if feed.get("topic_config_hash")))
 
                 # Log first few examples
-                if successful_count <= 3 and analysis:
+                for analysis in analyses[: max(0, 3 - successful_count)]:
                     top_phrases = [kp["phrase"] for kp in analysis["keyphrases"][:3]]
-                    logger.info(f"Sample analysis - Title: {feed.get('title', '')[:60]}...")
+                    logger.info(f"Sample analysis - Title: {analysis['title'][:60]}...")
                     logger.info(f"  Top phrases: {top_phrases}")
 
+                results.extend(analyses)
+                successful_count += len(analyses)
+
+                # Show progress every chunk
+                logger.info(f"Processed: {processed_count}/{total}")
+
             except Exception as e:
-                logger.error(f"Error processing feed {feed.get('_id', '')}: {e}")
+                failed_chunks += 1
+                ITEMS_PROCESSED.inc(len(chunk), component="topic", outcome="failed")
+                logger.error(f"Error processing feeds {chunk_start}-{chunk_start + len(chunk)}: {e}")
                 continue
 
+        if backfill_tracker and not failed_chunks and not limit:
+            backfill_tracker.finish()
+
         # Show summary
         logger.info("Topic analysis completed successfully")
-        logger.info(f"Analyzed: {successful_count}/{len(feeds)} feeds")
+        logger.info(f"Analyzed: {successful_count}/{total} feeds")
+        if self.cache:
+            self.cache.log_stats()
 
-        # Show most common keyphrases across all feeds
+        # Show cross-feed trends from the keyphrase index
         if results:
-            all_phrases = {}
-            for result in results:
-                for kp in result["keyphrases"][:5]:  # Top 5 phrases per feed
-                    phrase = kp["phrase"]
-                    all_phrases[phrase] = all_phrases.get(phrase, 0) + 1
-
-            logger.info("Most frequent keyphrases across all feeds:")
-            for phrase, count in sorted(all_phrases.items(), key=lambda x: x[1], reverse=True)[:10]:
-                logger.info(f"  {phrase}: {count} feeds")
+            logger.info("Top rising keyphrases in the last 24 hours:")
+            for trend in self.keyphrase_index.top_rising_phrases(hours=24, limit=10):
+                logger.info(f"  {trend['phrase']}: {trend['recent_count']} feeds (previous 24h: {trend['previous_count']})")
 
         return results
 
 
 def main():
     """Main function for automatic topic analysis"""
-    logger.info("Starting YAKE-based topic analysis system")
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Keyphrase topic analysis for RSS feeds")
+    parser.add_argument("--extractor", choices=["yake", "keybert"], default=TOPIC_EXTRACTOR, help="Keyphrase extractor")
+    parser.add_argument("--workers", type=int, default=TOPIC_WORKERS, help="Worker processes for YAKE keyphrase extraction")
+    parser.add_argument("--full", action="store_true", help="Re-analyze every feed instead of only pending ones")
+    parser.add_argument("--backfill", action="store_true", help="Re-analyze feeds analyzed with a previous extractor configuration")
+    parser.add_argument("--similar-to", metavar="FEED_ID", help="Only list the feeds most similar to this feed (keybert extractor)")
+    args = parser.parse_args()
+
+    logger.info(f"Starting {args.extractor.upper()}-based topic analysis system")
 
     # MongoDB configuration
     mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
 
     # Execute topic analysis
-    analyzer = SimpleTopicAnalyzer(mongo_manager)
-    analyzer.process_feeds(limit=None)  # Remove limit for full processing
+    analyzer = SimpleTopicAnalyzer(mongo_manager, workers=args.workers, extractor=args.extractor)
+    if args.similar_to:
+        for neighbour in analyzer.find_similar_feeds(ObjectId(args.similar_to)):
+            logger.info(f"  {neighbour['feedId']}: similarity {neighbour['similarity']:.3f}")
+        return
+
+    try:
+        with run_metrics("topic_analysis"):
+            analyzer.process_feeds(limit=None, incremental=not args.full, backfill=args.backfill)  # Remove limit for full processing
+    finally:
+        analyzer.close()
 
     logger.info("Topic analysis completed. Results saved in: feed_topic_analysis")
 
@@ -0,0 +1,46 @@
+# src/mains/main_apply_retention.py
+import argparse
+import logging
+
+from config import MONGO_DB_NAME, MONGO_URI, RETENTION_HOT_DAYS
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from metrics import run_metrics
+from services.retention_service import RETENTION_POLICIES, RetentionService
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Move the full text of old documents to cold storage, keeping slim stubs hot"""
+    parser = argparse.ArgumentParser(description="Tiered retention for feeds and analysis collections")
+    parser.add_argument("--hot-days", type=int, default=RETENTION_HOT_DAYS, help="Age in days after which documents are archived")
+    parser.add_argument(
+        "--collections",
+        type=lambda value: value.split(","),
+        default=list(RETENTION_POLICIES),
+        help=f"Comma separated subset of: {','.join(RETENTION_POLICIES)}",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that would be archived")
+    args = parser.parse_args()
+
+    unknown = set(args.collections) - set(RETENTION_POLICIES)
+    if unknown:
+        parser.error(f"Unknown collections: {sorted(unknown)}")
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    mongo_manager.ping()
+    policies = {collection_name: RETENTION_POLICIES[collection_name] for collection_name in args.collections}
+    retention_service = RetentionService(mongo_manager, hot_days=args.hot_days, policies=policies)
+
+    if args.dry_run:
+        logger.info(f"Documents to archive: {retention_service.pending_counts()}")
+        return
+
+    with run_metrics("retention"):
+        retention_service.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import MONGO_DB_NAME, MONGO_URI
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging, setup_worker_logging, worker_log_queue
+
+logger = logging.getLogger(__name__)
+
+# Fixed corpus so runs are comparable across hosts and models; mixed lengths on purpose
+BENCHMARK_CORPUS = [
+    "El dólar MEP cerró en alza.",
+    "Las acciones argentinas subieron con fuerza en Wall Street tras el anuncio del acuerdo con el FMI.",
+    "El Banco Central compró reservas por tercera rueda consecutiva y el riesgo país perforó los 1.200 puntos.",
+    "La inflación de septiembre se desaceleró al 3,5% mensual según el INDEC.",
+    "Caen los bonos en dólares ante la incertidumbre electoral y la falta de definiciones sobre el programa económico.",
+    "Récord de exportaciones agroindustriales en el primer semestre.",
+    "El Merval retrocedió 4% arrastrado por los bancos y las energéticas, mientras los inversores buscan cobertura en dólares. "
+    "Los analistas advierten que la volatilidad continuará hasta que se conozcan las nuevas metas fiscales y monetarias.",
+    "YPF anunció inversiones por US$ 5.000 millones en Vaca Muerta para los próximos tres años.",
+    "Sin cambios en la tasa de política monetaria.",
+    "La actividad económica cayó por quinto mes consecutivo y el desempleo alcanzó su nivel más alto desde 2021, "
+    "con fuerte impacto en la construcción, la industria y el comercio minorista en todo el país.",
+    "Las reservas internacionales superaron los US$ 30.000 millones.",
+    "Suben las tarifas de luz y gas a partir del próximo mes.",
+    "El Tesoro consiguió financiamiento en pesos por encima de los vencimientos y extendió la duración de la deuda.",
+    "Fuerte baja del consumo masivo en supermercados.",
+    "Los depósitos a plazo fijo crecieron en términos reales por primera vez en el año, impulsados por tasas positivas. "
+    "Las entidades financieras reportan mayor demanda de crédito hipotecario y prendario, aunque desde niveles muy bajos.",
+    "Moody's mejoró la calificación de la deuda soberana.",
+]
+
+
+def _percentiles_ms(latencies: list[float]) -> dict:
+    values = np.array(latencies) * 1000
+    return {f"p{p}": float(np.percentile(values, p)) for p in (50, 95, 99)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_config(model_info: dict, texts: list[str], backend: str, batch_size: int, num_threads: int) -> dict:
+    """Run one benchmark configuration; executed in a fresh process so RSS and load time are isolated"""
+    import_start = time.perf_counter()
+    from mains.main_analyze_sentiment_model_rss_feeds import SentimentPredictor
+
+    import_seconds = time.perf_counter() - import_start
+
+    load_start = time.perf_counter()
+    predictor = SentimentPredictor(None, batch_size=batch_size, num_threads=num_threads, backend=backend, model_info=model_info, use_cache=False)
+    predictor.load()
+    load_seconds = time.perf_counter() - load_start
+
+    # Warm-up batch, not measured
+    predictor.predict_sentiments(texts[:batch_size])
+
+    latencies = []
+    run_start = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        predictor.predict_sentiments(texts[start : start + batch_size])
+        latencies.append(time.perf_counter() - batch_start)
+    run_seconds = time.perf_counter() - run_start
+
+    return {
+        "backend": backend,
+        "batch_size": batch_size,
+        "num_threads": num_threads,
+        "documents": len(texts),
+        "docs_per_sec": len(texts) / run_seconds,
+        "batch_latency_ms": _percentiles_ms(latencies),
+        "doc_latency_ms": _percentiles_ms([latency / batch_size for latency in latencies]),
+        "import_seconds": import_seconds + predictor.timings["heavy_imports"],
+        "model_load_seconds": load_seconds - predictor.timings["heavy_imports"],
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+class SentimentBenchmark:
+    def __init__(self, model_info: dict, texts: list[str]):
+        self.model_info = model_info
+        self.texts = texts
+
+    @classmethod
+    def from_local_dir(cls, model_dir: str, texts: list[str]):
+        """Benchmark a model directory without going through sentiment_model_metadata"""
+        model_dir = os.path.abspath(model_dir)
+        onnx_candidates = [os.path.join(model_dir, "onnx", name) for name in ("model.int8.onnx", "model.onnx")]
+        model_info = {
+            "model_id": f"local:{model_dir}",
+            "model_name": os.path.basename(model_dir),
+            "model_path": model_dir,
+            "onnx_model_path": next((path for path in onnx_candidates if os.path.exists(path)), None),
+        }
+        return cls(model_info, texts)
+
+    @classmethod
+    def from_best_model(cls, mongo_manager, texts: list[str]):
+        """Benchmark the current best model recorded in sentiment_model_metadata"""
+        from mains.main_analyze_sentiment_model_rss_feeds import find_best_model
+
+        model_info = find_best_model(mongo_manager)
+        keys = ("model_id", "model_name", "model_path", "onnx_model_path")
+        return cls({key: str(model_info[key]) if key == "model_id" else model_info.get(key) for key in keys}, texts)
+
+    def run(self, backends: list[str], batch_sizes: list[int], thread_counts: list[int]) -> dict:
+        """Sweep every (backend, batch size, threads) combination, one child process each"""
+        results = []
+        context = multiprocessing.get_context("spawn")
+
+        for backend in backends:
+            for num_threads in thread_counts:
+                for batch_size in batch_sizes:
+                    logger.info(f"Benchmarking backend={backend} batch_size={batch_size} threads={num_threads}")
+                    with ProcessPoolExecutor(
+                        max_workers=1, mp_context=context, initializer=setup_worker_logging, initargs=(worker_log_queue(context),)
+                    ) as executor:
+                        future = executor.submit(_run_config, self.model_info, self.texts, backend, batch_size, num_threads)
+                        try:
+                            result = future.result()
+                            logger.info(f"  {result['docs_per_sec']:.1f} docs/sec, p95 batch latency {result['batch_latency_ms']['p95']:.1f} ms")
+                        except Exception as e:
+                            logger.error(f"  Benchmark failed: {e}")
+                            result = {"backend": backend, "batch_size": batch_size, "num_threads": num_threads, "error": str(e)}
+                    results.append(result)
+
+        return {
+            "model": self.model_info,
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "results": results,
+        }
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    """Main function for the sentiment inference benchmark"""
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Benchmark sentiment inference throughput and latency")
+    parser.add_argument("--model-dir", help="Local model directory (default: best model in sentiment_model_metadata)")
+    parser.add_argument("--corpus", help="Text file with one document per line (default: built-in corpus)")
+    parser.add_argument("--documents", type=int, default=512, help="Number of documents scored per configuration")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8, 32], help="Comma separated batch sizes")
+    parser.add_argument("--threads", type=_int_list, default=[os.cpu_count() or 1], help="Comma separated thread counts")
+    parser.add_argument("--backends", default="torch", help="Comma separated backends (torch, onnx)")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    corpus = BENCHMARK_CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as corpus_file:
+            corpus = [line.strip() for line in corpus_file if line.strip()]
+    texts = [corpus[i % len(corpus)] for i in range(args.documents)]
+
+    if args.model_dir:
+        benchmark = SentimentBenchmark.from_local_dir(args.model_dir, texts)
+    else:
+        benchmark = SentimentBenchmark.from_best_model(MongoManagerDAO(MONGO_URI, MONGO_DB_NAME), texts)
+
+    report = benchmark.run(args.backends.split(","), args.batch_sizes, args.threads)
+    report_json = json.dumps(report, indent=2, default=str)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(report_json)
+        logger.info(f"Benchmark report saved in: {args.output}")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,15 @@
 import logging
 
 from clients.selenium_client import SeleniumClient
-from config import BYMA_COLLECTION, DOWNLOAD_DIR, HISTORICAL_URLS, MONGO_DB_NAME, MONGO_URI
+from config import DOWNLOAD_DIR, HISTORICAL_URLS, MONGO_DB_NAME, MONGO_URI
 from dao.file_manager_dao import FileManagerDAO
 from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from metrics import run_metrics
 from services.download_service import DownloadService
+from services.indicators_service import IndicatorsService
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -17,14 +19,18 @@ def main():
 
     selenium_client = SeleniumClient(DOWNLOAD_DIR)
     file_manager = FileManagerDAO(DOWNLOAD_DIR)
-    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME, BYMA_COLLECTION)
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
     service = DownloadService(selenium_client, file_manager, mongo_manager)
 
-    try:
-        service.collect_and_store(HISTORICAL_URLS)
-    finally:
-        selenium_client.quit()
-        logger.info("Historical data collection finished.")
+    with run_metrics("collect_historical_data"):
+        try:
+            service.download_and_store(HISTORICAL_URLS)
+        finally:
+            selenium_client.quit()
+            logger.info("Historical data collection finished.")
+
+        # Post-ingest stage: precompute weekly/monthly bars and indicators for the backend
+        IndicatorsService(mongo_manager).update_all()
 
 
 if __name__ == "__main__":
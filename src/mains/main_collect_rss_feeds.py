@@ -1,12 +1,13 @@
 # src/mains/main_collect_feeds.py
-import logging.config
+import logging
 
 from config import MONGO_DB_NAME, MONGO_URI, RSS_FEEDS
 from dao.mongo_manager_dao import MongoManagerDAO
-from logging_config import LOGGING_CONFIG
+from logging_config import setup_logging
+from metrics import run_metrics
 from services.rss_collector_service import RSSCollectorService
 
-logging.config.dictConfig(LOGGING_CONFIG)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -18,7 +19,9 @@ def main():
     rss_service = RSSCollectorService(mongo_manager)
 
     # Optional: pass hours_threshold as parameter (default is 6)
-    rss_service.fetch_and_store(RSS_FEEDS, hours_threshold=6)
+    with run_metrics("collect_rss_feeds"):
+        rss_service.fetch_and_store(RSS_FEEDS, hours_threshold=6)
+        rss_service.backfill_analysis_text()
 
     logger.info("RSS feed collection finished.")
 
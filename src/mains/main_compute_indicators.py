@@ -0,0 +1,24 @@
+# src/mains/main_compute_indicators.py
+import logging
+
+from config import MONGO_DB_NAME, MONGO_URI
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from services.indicators_service import IndicatorsService
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logger.info("Starting indicators precompute service...")
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    indicators_service = IndicatorsService(mongo_manager)
+    indicators_service.update_all()
+
+    logger.info("Indicators precompute finished.")
+
+
+if __name__ == "__main__":
+    main()
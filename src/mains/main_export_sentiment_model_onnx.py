@@ -0,0 +1,129 @@
+import argparse
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from config import MONGO_DB_NAME, MONGO_URI, ONNX_PARITY_MIN_AGREEMENT
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from mains.main_analyze_sentiment_model_rss_feeds import SentimentPredictor, find_best_model
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class OnnxModelExporter:
+    def __init__(self, mongo_manager_dao, quantize: bool = True, opset_version: int = 17):
+        self.mongo_manager = mongo_manager_dao
+        self.quantize = quantize
+        self.opset_version = opset_version
+
+    def _export(self, model_info: dict) -> str:
+        """Export the torch checkpoint to ONNX, optionally with dynamic int8 quantization"""
+        model_path = model_info["model_path"]
+        onnx_dir = os.path.join(model_path, "onnx")
+        os.makedirs(onnx_dir, exist_ok=True)
+        fp32_path = os.path.join(onnx_dir, "model.onnx")
+
+        logger.info(f"Exporting {model_info['model_name']} to ONNX: {fp32_path}")
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        model.eval()
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        sample = tokenizer(["texto de ejemplo para exportar"], return_tensors="pt")
+
+        with torch.inference_mode():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=self.opset_version,
+            )
+
+        if not self.quantize:
+            return fp32_path
+
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(onnx_dir, "model.int8.onnx")
+        logger.info(f"Applying dynamic int8 quantization: {int8_path}")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _parity_check(self, model_info: dict, onnx_model_path: str) -> dict:
+        """Compare torch and ONNX predictions on sentiment_final_test"""
+        test_data = self.mongo_manager.find({}, "sentiment_final_test", projection={"_id": 0, "text": 1})
+        texts = [item["text"] for item in test_data if item.get("text")]
+        if not texts:
+            raise ValueError("No test data in sentiment_final_test for the ONNX parity check")
+
+        torch_predictor = SentimentPredictor(self.mongo_manager, backend="torch", model_info=model_info)
+        onnx_predictor = SentimentPredictor(self.mongo_manager, backend="onnx", model_info={**model_info, "onnx_model_path": onnx_model_path})
+        torch_predictions = torch_predictor.predict_sentiments(texts)
+        onnx_predictions = onnx_predictor.predict_sentiments(texts)
+
+        labels = sorted(torch_predictions[0]["all_scores"])
+        torch_scores = np.array([[p["all_scores"][label] for label in labels] for p in torch_predictions])
+        onnx_scores = np.array([[p["all_scores"][label] for label in labels] for p in onnx_predictions])
+        agreement = np.mean([t["sentiment_label"] == o["sentiment_label"] for t, o in zip(torch_predictions, onnx_predictions, strict=True)])
+        deltas = np.abs(torch_scores - onnx_scores)
+
+        parity = {
+            "examples": len(texts),
+            "label_agreement": float(agreement),
+            "max_score_delta": float(deltas.max()),
+            "mean_score_delta": float(deltas.mean()),
+            "checked_at": datetime.now(),
+        }
+        logger.info(
+            f"ONNX parity on {parity['examples']} examples: agreement {parity['label_agreement']:.2%}, "
+            f"max delta {parity['max_score_delta']:.4f}, mean delta {parity['mean_score_delta']:.4f}"
+        )
+        return parity
+
+    def export_best_model(self) -> dict:
+        """Export the model used by SentimentPredictor, check parity and register the artifact"""
+        model_info = find_best_model(self.mongo_manager)
+
+        onnx_model_path = self._export(model_info)
+        parity = self._parity_check(model_info, onnx_model_path)
+
+        update = {"onnx_parity": parity, "onnx_quantized": self.quantize}
+        if parity["label_agreement"] >= ONNX_PARITY_MIN_AGREEMENT:
+            update.update({"onnx_model_path": onnx_model_path, "onnx_exported_at": datetime.now()})
+        self.mongo_manager.update_one({"_id": model_info["_id"]}, {"$set": update}, "sentiment_model_metadata")
+
+        if parity["label_agreement"] < ONNX_PARITY_MIN_AGREEMENT:
+            raise ValueError(f"ONNX parity check failed: label agreement {parity['label_agreement']:.2%} < {ONNX_PARITY_MIN_AGREEMENT:.2%}")
+
+        logger.info(f"Registered ONNX model for {model_info['model_name']}: {onnx_model_path}")
+        return update
+
+
+def main():
+    """Main function for ONNX export of the sentiment model"""
+    parser = argparse.ArgumentParser(description="Export the best sentiment model to ONNX")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep full precision weights")
+    args = parser.parse_args()
+
+    logger.info("Starting ONNX export of the sentiment model")
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    exporter = OnnxModelExporter(mongo_manager, quantize=not args.no_quantize)
+    exporter.export_best_model()
+
+    logger.info("ONNX export finished")
+
+
+if __name__ == "__main__":
+    main()
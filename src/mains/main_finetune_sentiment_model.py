@@ -1,18 +1,125 @@
+import argparse
 import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
 
-from config import MONGO_DB_NAME, MONGO_URI
+from config import MONGO_DB_NAME, MONGO_URI, SENTIMENT_BATCH_SIZE, SENTIMENT_NUM_THREADS
 from dao.mongo_manager_dao import MongoManagerDAO
+from services.evaluation_cache import EvaluationCache, model_fingerprint, test_set_fingerprint
+from services.prediction_cache import text_hash
 
 logger = logging.getLogger(__name__)
 
 
+# ---------------- Metrics ----------------
+
+
+def compute_metrics(expected: list[str], predicted: list[str | None], confidences: list[float], n_bins: int = 10) -> dict:
+    """
+    Accuracy, confusion matrix, per-class precision/recall/F1 and calibration (ECE over
+    equal-width confidence bins) for one model. predicted is None for examples that could
+    not be classified; they count as errors.
+    """
+    labels = sorted(set(expected) | {label for label in predicted if label is not None})
+    label_index = {label: index for index, label in enumerate(labels)}
+    y_true = np.array([label_index[label] for label in expected])
+    y_pred = np.array([label_index[label] if label is not None else -1 for label in predicted])
+    confidences = np.asarray(confidences, dtype="float64")
+    classified = y_pred >= 0
+    correct = y_true == y_pred
+
+    confusion = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    np.add.at(confusion, (y_true[classified], y_pred[classified]), 1)
+
+    support = np.bincount(y_true, minlength=len(labels))
+    true_positives = np.diag(confusion)
+    predicted_counts = confusion.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted_counts > 0, true_positives / predicted_counts, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    # Calibration over classified examples: |accuracy - mean confidence| per bin, weighted by bin size
+    bins = np.minimum((confidences[classified] * n_bins).astype(int), n_bins - 1)
+    bin_counts = np.bincount(bins, minlength=n_bins)
+    bin_confidence = np.bincount(bins, weights=confidences[classified], minlength=n_bins)
+    bin_correct = np.bincount(bins, weights=correct[classified], minlength=n_bins)
+    ece = float(np.abs(bin_correct - bin_confidence).sum() / max(1, classified.sum()))
+
+    return {
+        "examples": len(expected),
+        "accuracy": float(correct.mean()) if len(expected) else 0.0,
+        "labels": labels,
+        "confusion_matrix": confusion.tolist(),
+        "per_class": {
+            label: {"precision": float(precision[i]), "recall": float(recall[i]), "f1": float(f1[i]), "support": int(support[i])}
+            for i, label in enumerate(labels)
+        },
+        "macro_f1": float(f1.mean()) if len(labels) else 0.0,
+        "weighted_f1": float((f1 * support).sum() / max(1, support.sum())),
+        "ece": ece,
+        "calibration": [
+            {
+                "bin": f"{i / n_bins:.1f}-{(i + 1) / n_bins:.1f}",
+                "examples": int(bin_counts[i]),
+                "confidence": float(bin_confidence[i] / bin_counts[i]),
+                "accuracy": float(bin_correct[i] / bin_counts[i]),
+            }
+            for i in range(n_bins)
+            if bin_counts[i]
+        ],
+    }
+
+
+def print_metrics(model_name: str, metrics: dict):
+    """Muestra las métricas de un modelo"""
+    print(f"📊 {model_name} - Accuracy: {metrics['accuracy']:.1%} | Macro F1: {metrics['macro_f1']:.3f} | ECE: {metrics['ece']:.3f}")
+    for label, label_metrics in metrics["per_class"].items():
+        print(
+            f"   • {label}: P={label_metrics['precision']:.3f} R={label_metrics['recall']:.3f} " f"F1={label_metrics['f1']:.3f} (n={label_metrics['support']})"
+        )
+
+    print("   🔢 Matriz de confusión (filas: esperado, columnas: predicho):")
+    width = max(len(label) for label in metrics["labels"])
+    print(f"      {'':>{width}} " + " ".join(f"{label:>{width}}" for label in metrics["labels"]))
+    for label, row in zip(metrics["labels"], metrics["confusion_matrix"], strict=True):
+        print(f"      {label:>{width}} " + " ".join(f"{count:>{width}}" for count in row))
+
+
+# ---------------- Parallel evaluation ----------------
+
+
+def _evaluate_in_worker(model_info: dict, test_data: list[dict], batch_size: int, num_threads: int, verbose: bool) -> dict:
+    """Carga y evalúa un modelo en un proceso worker (sin conexión a MongoDB)"""
+    tester = ModelTester(None, batch_size=batch_size, num_threads=num_threads, verbose=verbose)
+    model, tokenizer = tester._load_model(model_info)
+    accuracy, results, metrics = tester.evaluate_model(model, tokenizer, test_data, model_info["model_name"])
+    return {"accuracy": accuracy, "results": results, "metrics": metrics}
+
+
 class ModelTester:
-    def __init__(self, mongo_manager_dao):
+    def __init__(
+        self,
+        mongo_manager_dao,
+        batch_size: int = SENTIMENT_BATCH_SIZE,
+        num_threads: int = SENTIMENT_NUM_THREADS,
+        workers: int = 1,
+        verbose: bool = False,
+        use_cache: bool = True,
+    ):
         self.mongo_manager = mongo_manager_dao
         self.models_base_path = "./llm_models"
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        # Con workers > 1 cada modelo se evalúa en su propio proceso y los threads de torch se reparten
+        self.workers = max(1, workers)
+        self.verbose = verbose
+        # Resultados guardados por (modelo, fingerprint del modelo, fingerprint del test set)
+        self.evaluation_cache = EvaluationCache(mongo_manager_dao) if use_cache and mongo_manager_dao is not None else None
 
     def _get_fine_tuned_models(self):
         """Obtiene modelos fine-tuned desde MongoDB"""
@@ -41,7 +148,8 @@ class ModelTester:
 
     def _get_final_test_data(self):
         """Obtiene datos frescos de test final"""
-        test_data = list(self.mongo_manager.db.sentiment_final_test.find({}, {"_id": 0}))
+        # Orden fijo, para que los índices de los resultados sean reproducibles entre corridas
+        test_data = list(self.mongo_manager.db.sentiment_final_test.find({}, {"_id": 0}).sort([("text", 1), ("label", 1)]))
 
         if not test_data:
             raise ValueError("❌ No hay datos de test final en sentiment_final_test")
@@ -69,7 +177,10 @@ class ModelTester:
         return model, tokenizer
 
     def evaluate_model(self, model, tokenizer, test_data, model_name):
-        """Evalúa un modelo con datos frescos mostrando probabilidades completas"""
+        """Evalúa un modelo con datos frescos en batches ordenados por longitud"""
+        import torch
+
+        torch.set_num_threads(self.num_threads)
         sentiment_pipeline = pipeline(
             "sentiment-analysis",
             model=model,
@@ -78,72 +189,162 @@ class ModelTester:
             device=0 if torch.backends.mps.is_built() else -1,
         )
 
-        correct = 0
-        results = []
-
         print(f"🧪 Evaluando {model_name}...")
 
-        for i, test_item in enumerate(test_data):
-            try:
-                # 🔥 AHORA DEVUELVE TODAS LAS SCORES
-                result = sentiment_pipeline(test_item["text"][:512])[0]
-
-                # Encontrar la predicción con mayor probabilidad
-                best_pred = max(result, key=lambda x: x["score"])
-                predicted = best_pred["label"]
-                confidence = best_pred["score"]
-
-                is_correct = predicted == test_item["label"]
-
-                # 🔥 MOSTRAR PROBABILIDADES COMPLETAS PARA ERRORES
-                if not is_correct:
-                    print(f"   ❌ ERROR #{i + 1}")
-                    print(f"      Texto: '{test_item['text'][:60]}...'")
-                    print(f"      Esperado: {test_item['label']}")
-                    print(f"      Predicción: {predicted} ({confidence:.1%})")
-                    print("      🔍 Probabilidades completas:")
-                    for score in sorted(result, key=lambda x: x["score"], reverse=True):
-                        marker = "←" if score["label"] == predicted else ""
-                        print(f"         {score['label']}: {score['score']:.3f} ({score['score']:.1%}) {marker}")
-                    print()
-
-                if is_correct:
-                    correct += 1
-
-                results.append(
-                    {
-                        "text": test_item["text"],
-                        "expected": test_item["label"],
-                        "predicted": predicted,
-                        "confidence": confidence,
-                        "all_scores": result,  # 🔥 GUARDAR TODAS LAS PROBABILIDADES
-                        "correct": is_correct,
-                    }
-                )
+        # Textos ordenados por longitud: cada batch tiene padding similar
+        texts = [test_item["text"][:512] for test_item in test_data]
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        scores = [None] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                bucket = order[start : start + self.batch_size]
+                try:
+                    outputs = sentiment_pipeline([texts[i] for i in bucket], batch_size=len(bucket), truncation=True)
+                except Exception as e:
+                    print(f"❌ Error procesando ejemplos {start}-{start + len(bucket)}: {e}")
+                    continue
+                for i, output in zip(bucket, outputs, strict=True):
+                    scores[i] = output
 
-            except Exception as e:
-                print(f"❌ Error procesando ejemplo {i}: {e}")
+        results = []
+        predicted_labels = [None] * len(test_data)
+        confidences = [0.0] * len(test_data)
+        for i, (test_item, result) in enumerate(zip(test_data, scores, strict=True)):
+            if result is None:
                 continue
 
-        accuracy = correct / len(test_data)
+            # Encontrar la predicción con mayor probabilidad
+            best_pred = max(result, key=lambda x: x["score"])
+            predicted = predicted_labels[i] = best_pred["label"]
+            confidence = confidences[i] = best_pred["score"]
+            is_correct = predicted == test_item["label"]
+
+            # 🔥 PROBABILIDADES COMPLETAS PARA ERRORES (solo en modo verbose)
+            if self.verbose and not is_correct:
+                print(f"   ❌ ERROR #{i + 1}")
+                print(f"      Texto: '{test_item['text'][:60]}...'")
+                print(f"      Esperado: {test_item['label']}")
+                print(f"      Predicción: {predicted} ({confidence:.1%})")
+                print("      🔍 Probabilidades completas:")
+                for score in sorted(result, key=lambda x: x["score"], reverse=True):
+                    marker = "←" if score["label"] == predicted else ""
+                    print(f"         {score['label']}: {score['score']:.3f} ({score['score']:.1%}) {marker}")
+                print()
+
+            results.append(
+                {
+                    "index": i,
+                    "text": test_item["text"],
+                    "expected": test_item["label"],
+                    "predicted": predicted,
+                    "confidence": confidence,
+                    "all_scores": result,  # 🔥 GUARDAR TODAS LAS PROBABILIDADES
+                    "correct": is_correct,
+                }
+            )
+
+        # Las métricas se calculan sobre todo el test set: los ejemplos fallidos cuentan como error
+        metrics = compute_metrics(
+            [test_item["label"] for test_item in test_data],
+            predicted_labels,
+            confidences,
+        )
+        print_metrics(model_name, metrics)
 
-        # Calcular métricas por label
-        from collections import defaultdict
+        return metrics["accuracy"], results, metrics
 
-        label_metrics = defaultdict(lambda: {"correct": 0, "total": 0})
+    def _evaluate_models(self, fine_tuned_models, test_data):
+        """Evalúa los modelos en serie o en procesos worker en paralelo"""
+        evaluation_results = []
 
-        for result in results:
-            label = result["expected"]
-            label_metrics[label]["total"] += 1
-            if result["correct"]:
-                label_metrics[label]["correct"] += 1
+        if self.workers == 1 or len(fine_tuned_models) == 1:
+            for model_info in fine_tuned_models:
+                print(f"\n🔍 EVALUANDO: {model_info['model_name']}")
+                print("-" * 40)
+                try:
+                    model, tokenizer = self._load_model(model_info)
+                    accuracy, results, metrics = self.evaluate_model(model, tokenizer, test_data, model_info["model_name"])
+                    evaluation_results.append({"model_info": model_info, "accuracy": accuracy, "results": results, "metrics": metrics})
+                except Exception as e:
+                    print(f"❌ Error evaluando {model_info['model_name']}: {e}")
+            return evaluation_results
+
+        workers = min(self.workers, len(fine_tuned_models))
+        threads_per_worker = max(1, self.num_threads // workers)
+        print(f"\n⚡ Evaluando {len(fine_tuned_models)} modelos en {workers} procesos ({threads_per_worker} threads c/u)")
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                (model_info, executor.submit(_evaluate_in_worker, model_info, test_data, self.batch_size, threads_per_worker, self.verbose))
+                for model_info in fine_tuned_models
+            ]
+            for model_info, future in futures:
+                try:
+                    evaluation_results.append({"model_info": model_info, **future.result()})
+                except Exception as e:
+                    print(f"❌ Error evaluando {model_info['model_name']}: {e}")
+
+        return evaluation_results
+
+    def _evaluate_models_cached(self, fine_tuned_models, test_data):
+        """Reutiliza evaluaciones guardadas y solo evalúa modelos nuevos o modificados (o un test set distinto)"""
+        if not self.evaluation_cache:
+            return self._evaluate_models(fine_tuned_models, test_data)
+
+        test_set_fp = test_set_fingerprint(test_data)
+        cached = {}
+        pending = []
+        fingerprints = {}
+
+        for index, model_info in enumerate(fine_tuned_models):
+            try:
+                fingerprints[index] = model_fingerprint(model_info["model_path"])
+            except (OSError, ValueError):
+                # Modelo inexistente: se intenta evaluar y el error se informa ahí
+                pending.append((index, model_info))
+                continue
 
-        print(f"📊 {model_name} - Accuracy: {accuracy:.1%}")
-        for label, metrics in label_metrics.items():
-            label_accuracy = metrics["correct"] / metrics["total"] if metrics["total"] > 0 else 0
-            print(f"   • {label}: {metrics['correct']}/{metrics['total']} ({label_accuracy:.1%})")
+            stored = self.evaluation_cache.get(model_info["model_id"], fingerprints[index], test_set_fp)
+            # Las evaluaciones guardadas sin text_hash (solo con índice) no se pueden unir de forma segura
+            if stored and all("text_hash" in result for result in stored["results"]):
+                print(f"♻️  {model_info['model_name']}: evaluación guardada ({stored['accuracy']:.1%}), sin inferencia")
+                # Los resultados se unen por hash del texto: el orden de sentiment_final_test puede cambiar
+                index_by_hash = {}
+                for example_index, item in enumerate(test_data):
+                    index_by_hash.setdefault(text_hash(item["text"]), example_index)
+                results = [
+                    {**result, "index": index_by_hash[result["text_hash"]], "text": test_data[index_by_hash[result["text_hash"]]]["text"]}
+                    for result in stored["results"]
+                ]
+                cached[index] = {"model_info": model_info, "accuracy": stored["accuracy"], "results": results, "metrics": stored["metrics"]}
+            else:
+                pending.append((index, model_info))
+
+        print(f"📦 Evaluaciones reutilizadas: {len(cached)}/{len(fine_tuned_models)}")
+
+        evaluated = self._evaluate_models([model_info for _, model_info in pending], test_data)
+        evaluated_by_id = {id(evaluation["model_info"]): evaluation for evaluation in evaluated}
+
+        for index, model_info in pending:
+            evaluation = evaluated_by_id.get(id(model_info))
+            if evaluation is None:
+                continue
+            cached[index] = evaluation
+            if index in fingerprints:
+                # El texto ya está en sentiment_final_test: se guarda solo su hash
+                stored_results = [
+                    {**{key: value for key, value in result.items() if key != "text"}, "text_hash": text_hash(result["text"])}
+                    for result in evaluation["results"]
+                ]
+                self.evaluation_cache.put(
+                    model_info["model_id"],
+                    fingerprints[index],
+                    test_set_fp,
+                    {"model_name": model_info["model_name"], "accuracy": evaluation["accuracy"], "metrics": evaluation["metrics"], "results": stored_results},
+                )
 
-        return accuracy, results
+        return [cached[index] for index in sorted(cached)]
 
     def run_final_evaluation(self):
         """Ejecuta evaluación final con datos frescos para todos los modelos fine-tuned"""
@@ -159,41 +360,27 @@ class ModelTester:
         # Obtener datos frescos
         test_data = self._get_final_test_data()
 
-        evaluation_results = []
+        evaluation_results = self._evaluate_models_cached(fine_tuned_models, test_data)
 
-        for model_info in fine_tuned_models:
-            print(f"\n🔍 EVALUANDO: {model_info['model_name']}")
-            print("-" * 40)
+        for evaluation in evaluation_results:
+            results = evaluation["results"]
 
-            try:
-                # Cargar modelo
-                model, tokenizer = self._load_model(model_info)
+            # Mostrar algunos ejemplos
+            print(f"\n🔎 MUESTRA DE RESULTADOS: {evaluation['model_info']['model_name']}")
+            correct_examples = [r for r in results if r["correct"]]
+            incorrect_examples = [r for r in results if not r["correct"]]
 
-                # Evaluar
-                accuracy, results = self.evaluate_model(model, tokenizer, test_data, model_info["model_name"])
+            if incorrect_examples:
+                print("   ❌ EJEMPLOS INCORRECTOS:")
+                for i, example in enumerate(incorrect_examples[:3]):
+                    print(f"      {i + 1}. '{example['text'][:50]}...'")
+                    print(f"         → Esperado: {example['expected']}, Predicho: {example['predicted']} ({example['confidence']:.1%})")
 
-                evaluation_results.append({"model_info": model_info, "accuracy": accuracy, "results": results})
-
-                # Mostrar algunos ejemplos
-                print("\n🔎 MUESTRA DE RESULTADOS:")
-                correct_examples = [r for r in results if r["correct"]]
-                incorrect_examples = [r for r in results if not r["correct"]]
-
-                if incorrect_examples:
-                    print("   ❌ EJEMPLOS INCORRECTOS:")
-                    for i, example in enumerate(incorrect_examples[:3]):
-                        print(f"      {i + 1}. '{example['text'][:50]}...'")
-                        print(f"         → Esperado: {example['expected']}, Predicho: {example['predicted']} ({example['confidence']:.1%})")
-
-                if correct_examples:
-                    print("   ✅ EJEMPLOS CORRECTOS:")
-                    for i, example in enumerate(correct_examples[:2]):
-                        print(f"      {i + 1}. '{example['text'][:50]}...'")
-                        print(f"         → {example['predicted']} ({example['confidence']:.1%})")
-
-            except Exception as e:
-                print(f"❌ Error evaluando {model_info['model_name']}: {e}")
-                continue
+            if correct_examples:
+                print("   ✅ EJEMPLOS CORRECTOS:")
+                for i, example in enumerate(correct_examples[:2]):
+                    print(f"      {i + 1}. '{example['text'][:50]}...'")
+                    print(f"         → {example['predicted']} ({example['confidence']:.1%})")
 
         if not evaluation_results:
             raise Exception("❌ Ningún modelo pudo ser evaluado exitosamente")
@@ -205,6 +392,7 @@ class ModelTester:
         print("\n🏆 MEJOR MODELO SELECCIONADO:")
         print(f"   📛 {best_model['model_name']}")
         print(f"   📊 Accuracy final: {best_result['accuracy']:.1%}")
+        print(f"   📐 Macro F1: {best_result['metrics']['macro_f1']:.3f} | ECE: {best_result['metrics']['ece']:.3f}")
         print(f"   🔧 Base: {best_model['fine_tuned_from']}")
 
         # Comparar con accuracy anterior
@@ -220,18 +408,21 @@ class ModelTester:
 
 def main():
     """MAIN PARA EVALUACIÓN FINAL DE MODELOS"""
+    parser = argparse.ArgumentParser(description="Evaluación final de los modelos de sentimiento fine-tuned")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para evaluar modelos en paralelo")
+    parser.add_argument("--batch-size", type=int, default=SENTIMENT_BATCH_SIZE, help="Ejemplos por batch de inferencia")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar las probabilidades completas de cada error")
+    parser.add_argument("--no-cache", action="store_true", help="Re-evaluar todos los modelos aunque no hayan cambiado")
+    args = parser.parse_args()
+
     print("🚀 INICIANDO EVALUACIÓN FINAL CON DATOS FRESCOS")
     print("=" * 50)
 
     # Configuración MongoDB
-    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME, "sentiment_collections")
-
-    # Importar torch para device detection
-    global torch
-    import torch
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
 
     # Ejecutar evaluación
-    tester = ModelTester(mongo_manager)
+    tester = ModelTester(mongo_manager, batch_size=args.batch_size, workers=args.workers, verbose=args.verbose, use_cache=not args.no_cache)
     results = tester.run_final_evaluation()
 
     print("\n🎉 EVALUACIÓN COMPLETADA")
@@ -0,0 +1,191 @@
+# src/mains/main_job_worker.py
+import argparse
+import logging
+import threading
+import time
+from datetime import date
+
+from config import DOWNLOAD_DIR, FEEDS_UPDATE_HOURS, HISTORICAL_URLS, MONGO_DB_NAME, MONGO_URI, RSS_FEEDS, SENTIMENT_SHARD_SIZE
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from metrics import start_http_server
+from services.job_queue_service import JobQueue, JobWorker
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class WorkerContext:
+    """Resources reused by every job run by this worker, each created on first use"""
+
+    def __init__(self, mongo_manager: MongoManagerDAO):
+        self.mongo_manager = mongo_manager
+        self._lock = threading.Lock()
+        self._sentiment_predictor = None
+        self._selenium_client = None
+
+    def sentiment_predictor(self, model_id):
+        """Predictor of the model a job was enqueued for, rebuilt when a job names another model"""
+        with self._lock:
+            if self._sentiment_predictor is None or self._sentiment_predictor.model_info["model_id"] != model_id:
+                from mains.main_analyze_sentiment_model_rss_feeds import SentimentPredictor
+
+                model_info = self.mongo_manager.find_one({"model_id": model_id}, "sentiment_model_metadata")
+                if model_info is None:
+                    raise ValueError(f"Sentiment model {model_id} not found in sentiment_model_metadata")
+                logger.info(f"Loading sentiment model {model_info['model_name']} ({model_id})")
+                self._sentiment_predictor = SentimentPredictor(self.mongo_manager, model_info=model_info)
+            return self._sentiment_predictor
+
+    @property
+    def selenium_client(self):
+        with self._lock:
+            if self._selenium_client is None:
+                from clients.selenium_client import SeleniumClient
+
+                self._selenium_client = SeleniumClient(DOWNLOAD_DIR)
+            return self._selenium_client
+
+    def close(self):
+        if self._selenium_client is not None:
+            self._selenium_client.quit()
+
+
+# ---------------- Handlers ----------------
+
+
+def handle_rss_feed(context: WorkerContext, job: dict) -> dict:
+    from services.rss_collector_service import RSSCollectorService
+
+    source_id = job["payload"]["sourceId"]
+    rss_feed = next((feed for feed in RSS_FEEDS if feed["sourceId"] == source_id), None)
+    if rss_feed is None:
+        raise ValueError(f"Unknown RSS sourceId: {source_id}")
+    result = RSSCollectorService(context.mongo_manager).collect_feed(rss_feed, execution_id=job["_id"])
+    if result["fetch_failed"]:
+        # Raised so the queue retries the fetch with backoff
+        raise RuntimeError(f"Could not fetch feed {rss_feed['url']}")
+    return result
+
+
+def handle_historical_ticker(context: WorkerContext, job: dict) -> dict:
+    from dao.file_manager_dao import FileManagerDAO
+    from services.download_service import DownloadService
+
+    payload = job["payload"]
+    download_service = DownloadService(context.selenium_client, FileManagerDAO(DOWNLOAD_DIR), context.mongo_manager)
+    download_service.download_and_store([(payload["url"], payload["filename"])])
+    return {"filename": payload["filename"]}
+
+
+def handle_sentiment_shard(context: WorkerContext, job: dict) -> dict:
+    payload = job["payload"]
+    # Shards are scored with the model they were split for, even after a newer one is promoted
+    results = context.sentiment_predictor(payload["model_id"]).process_rss_feeds(
+        incremental=payload.get("incremental", True),
+        backfill=payload.get("backfill", True),
+        id_range=(payload["first_id"], payload["last_id"]),
+        track_backfill=False,
+        # A partially scored shard is retried rather than marked done
+        raise_on_failure=True,
+    )
+    return {"processed": len(results)}
+
+
+HANDLERS = {
+    "rss_feed": handle_rss_feed,
+    "historical_ticker": handle_historical_ticker,
+    "sentiment_shard": handle_sentiment_shard,
+}
+
+
+# ---------------- Producers ----------------
+
+
+def enqueue_rss_feeds(job_queue: JobQueue) -> int:
+    """One job per feed and FEEDS_UPDATE_HOURS window, whichever node enqueues it first"""
+    window = int(time.time() // (FEEDS_UPDATE_HOURS * 3600))
+    created = 0
+    for rss_feed in RSS_FEEDS:
+        _, is_new = job_queue.enqueue("rss_feed", {"sourceId": rss_feed["sourceId"]}, dedupe_key=f"rss_feed:{rss_feed['sourceId']}:{window}")
+        created += is_new
+    return created
+
+
+def enqueue_historical_tickers(job_queue: JobQueue) -> int:
+    """One download job per historical URL and day"""
+    created = 0
+    for url, filename in HISTORICAL_URLS:
+        _, is_new = job_queue.enqueue("historical_ticker", {"url": url, "filename": filename}, dedupe_key=f"historical_ticker:{filename}:{date.today()}")
+        created += is_new
+    return created
+
+
+def enqueue_sentiment_shards(job_queue: JobQueue, mongo_manager: MongoManagerDAO, shard_size: int = SENTIMENT_SHARD_SIZE) -> int:
+    """Split the feeds pending for the best model into _id ranges of shard_size feeds"""
+    from mains.main_analyze_sentiment_model_rss_feeds import find_best_model, pending_feeds_query
+    from services.analysis_text import backfill_analysis_text
+
+    model_id = find_best_model(mongo_manager)["model_id"]
+    backfill_analysis_text(mongo_manager)
+    feed_ids = [feed["_id"] for feed in mongo_manager.find(pending_feeds_query(model_id), "rss_feeds_data", sort=[("_id", 1)], projection={"_id": 1})]
+
+    created = 0
+    for start in range(0, len(feed_ids), shard_size):
+        first_id, last_id = feed_ids[start], feed_ids[min(start + shard_size, len(feed_ids)) - 1]
+        _, is_new = job_queue.enqueue(
+            "sentiment_shard",
+            {"first_id": first_id, "last_id": last_id, "model_id": model_id},
+            dedupe_key=f"sentiment_shard:{model_id}:{first_id}:{last_id}",
+        )
+        created += is_new
+    logger.info(f"{len(feed_ids)} pending feeds split into {created} new sentiment shards")
+    return created
+
+
+def main():
+    """Run a worker node of the distributed job queue"""
+    parser = argparse.ArgumentParser(description="Claim and run collection and analysis jobs shared by all worker nodes")
+    parser.add_argument("--kinds", type=lambda value: value.split(","), default=list(HANDLERS), help=f"Comma separated subset of: {','.join(HANDLERS)}")
+    parser.add_argument("--enqueue", type=lambda value: value.split(","), default=[], help="Job kinds to enqueue before working (deduplicated across nodes)")
+    parser.add_argument("--enqueue-only", action="store_true", help="Enqueue and exit without processing jobs")
+    parser.add_argument("--drain", action="store_true", help="Exit when no job is available instead of polling")
+    parser.add_argument("--max-jobs", type=int, help="Exit after running this many jobs")
+    args = parser.parse_args()
+
+    unknown = set(args.kinds) - set(HANDLERS) | set(args.enqueue) - set(HANDLERS)
+    if unknown:
+        parser.error(f"Unknown job kinds: {sorted(unknown)}")
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    mongo_manager.ping()
+    job_queue = JobQueue(mongo_manager)
+
+    producers = {
+        "rss_feed": lambda: enqueue_rss_feeds(job_queue),
+        "historical_ticker": lambda: enqueue_historical_tickers(job_queue),
+        "sentiment_shard": lambda: enqueue_sentiment_shards(job_queue, mongo_manager),
+    }
+    for kind in args.enqueue:
+        logger.info(f"Enqueued {producers[kind]()} new {kind} jobs")
+    if args.enqueue_only:
+        logger.info(f"Queue: {job_queue.counts()}")
+        return
+
+    # Daemon mode: metrics are scraped from the HTTP endpoint when METRICS_HTTP_PORT is set
+    start_http_server()
+
+    context = WorkerContext(mongo_manager)
+    handlers = {kind: lambda job, handler=HANDLERS[kind]: handler(context, job) for kind in args.kinds}
+    worker = JobWorker(job_queue, handlers)
+    try:
+        worker.run(drain=args.drain, max_jobs=args.max_jobs)
+    except KeyboardInterrupt:
+        worker.stop()
+        logger.info("Job worker stopped.")
+    finally:
+        context.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# src/mains/main_replay_rss_archive.py
+import argparse
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from config import MONGO_DB_NAME, MONGO_URI, RAW_ARCHIVE_BACKEND, RAW_ARCHIVE_DIR, RSS_COLLECTION
+from dao.mongo_manager_dao import MongoManagerDAO
+from dao.raw_archive_dao import RawArchiveDAO
+from logging_config import setup_logging, setup_worker_logging, worker_log_queue
+from metrics import ITEMS_PROCESSED, run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Distinct items upserted per bulk write
+REPLAY_BATCH_SIZE = 5000
+
+# Per worker process archive reader, set once by _init_replay_worker
+_replay_archive = None
+
+
+def _init_replay_worker(backend: str, directory: str, log_queue=None):
+    global _replay_archive
+    if log_queue is not None:
+        setup_worker_logging(log_queue)
+    _replay_archive = RawArchiveDAO(MongoManagerDAO(MONGO_URI, MONGO_DB_NAME), backend, directory)
+
+
+def _parse_archived(record: dict) -> list[dict]:
+    """Re-parse one archived payload with the current normalization code"""
+    from services.rss_collector_service import parse_feed_entries
+
+    rss_feed = {"sourceId": record["sourceId"], "name": record["source_name"], "url": record["source"]}
+    items = parse_feed_entries(_replay_archive.load(record["sha256"]), rss_feed, fetched_at=record["first_fetched_at"])
+    for item in items:
+        # Replayed items keep the execution that originally collected them
+        item.pop("execution_id")
+    return items
+
+
+def replay(mongo_manager: MongoManagerDAO, query: dict, workers: int, backend: str = RAW_ARCHIVE_BACKEND, dry_run: bool = False) -> dict:
+    """
+    Re-parse every archived payload matching query and upsert the items into rss_feeds_data by
+    link. Payloads are processed oldest first, so the latest version of an item wins.
+    """
+    records = RawArchiveDAO(mongo_manager, backend, RAW_ARCHIVE_DIR).records(query)
+    logger.info(f"Replaying {len(records)} archived payloads with {workers} workers")
+    summary = {"payloads": 0, "items": 0, "upserted": 0, "modified": 0}
+    pending = {}
+
+    def flush():
+        if pending and not dry_run:
+            result = mongo_manager.bulk_upsert(list(pending.values()), ["link"], RSS_COLLECTION)
+            summary["upserted"] += result.upserted_count
+            summary["modified"] += result.modified_count
+        ITEMS_PROCESSED.inc(len(pending), component="rss_replay", outcome="replayed")
+        summary["items"] += len(pending)
+        pending.clear()
+
+    def consume(parsed):
+        for items in parsed:
+            summary["payloads"] += 1
+            for item in items:
+                if item.get("link"):
+                    pending[item["link"]] = item
+            if len(pending) >= REPLAY_BATCH_SIZE:
+                flush()
+                logger.info(f"Replayed {summary['payloads']}/{len(records)} payloads, {summary['items']} items")
+
+    if workers > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_replay_worker,
+            initargs=(backend, RAW_ARCHIVE_DIR, worker_log_queue(context)),
+        ) as executor:
+            consume(executor.map(_parse_archived, records, chunksize=8))
+    else:
+        _init_replay_worker(backend, RAW_ARCHIVE_DIR)
+        consume(map(_parse_archived, records))
+    flush()
+
+    logger.info(f"Replay completed: {summary}")
+    return summary
+
+
+def main():
+    """Rebuild rss_feeds_data items from the raw payload archive, without network access"""
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Re-parse archived raw RSS payloads into rss_feeds_data")
+    parser.add_argument("--source-id", type=int, help="Only replay payloads of this sourceId")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only payloads first fetched at or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Only payloads first fetched before this date (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    parser.add_argument("--backend", choices=["local", "gridfs"], default=RAW_ARCHIVE_BACKEND or "local", help="Archive storage")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and count items without writing them")
+    args = parser.parse_args()
+
+    query = {}
+    if args.source_id is not None:
+        query["sourceId"] = args.source_id
+    if args.since or args.until:
+        query["first_fetched_at"] = {key: value for key, value in (("$gte", args.since), ("$lt", args.until)) if value}
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    mongo_manager.ping()
+
+    with run_metrics("replay_rss_archive"):
+        replay(mongo_manager, query, workers=max(1, args.workers), backend=args.backend, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# src/mains/main_stream_analysis.py
+import argparse
+import logging
+import queue
+import threading
+
+from config import FEEDS_UPDATE_HOURS, MONGO_DB_NAME, MONGO_URI, RSS_FEEDS
+from dao.mongo_manager_dao import MongoManagerDAO
+from logging_config import setup_logging
+from mains.main_analyze_sentiment_model_rss_feeds import SentimentPredictor
+from mains.main_analyze_topic_model_rss_feeds import SimpleTopicAnalyzer
+from metrics import start_http_server
+from services.rss_collector_service import RSSCollectorService
+from services.streaming_analysis_service import StreamingAnalysisService
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def run_collector_loop(rss_service: RSSCollectorService, stop_event: threading.Event):
+    """Collect RSS feeds every FEEDS_UPDATE_HOURS, pushing new items to the analysis queue"""
+    while not stop_event.is_set():
+        try:
+            rss_service.fetch_and_store(RSS_FEEDS, hours_threshold=FEEDS_UPDATE_HOURS)
+        except Exception as e:
+            logger.error(f"RSS collection failed: {e}")
+        stop_event.wait(FEEDS_UPDATE_HOURS * 3600)
+
+
+def main():
+    """Main function for streaming sentiment and topic analysis of new feeds"""
+    parser = argparse.ArgumentParser(description="Streaming analysis of newly ingested RSS feeds")
+    parser.add_argument(
+        "--source",
+        choices=["change_stream", "queue"],
+        default="change_stream",
+        help="change_stream: watch rss_feeds_data inserts (replica set required); queue: run the RSS collector in-process",
+    )
+    args = parser.parse_args()
+
+    logger.info(f"Starting streaming analysis service ({args.source})...")
+
+    # Daemon mode: metrics are scraped from the HTTP endpoint when METRICS_HTTP_PORT is set
+    start_http_server()
+
+    mongo_manager = MongoManagerDAO(MONGO_URI, MONGO_DB_NAME)
+    analyzers = [SentimentPredictor(mongo_manager), SimpleTopicAnalyzer(mongo_manager)]
+    streaming_service = StreamingAnalysisService(mongo_manager, analyzers, checkpoint_name=f"rss_feeds_analysis_{args.source}")
+
+    try:
+        if args.source == "queue":
+            feeds_queue = queue.Queue()
+            rss_service = RSSCollectorService(mongo_manager, analysis_queue=feeds_queue)
+            collector_thread = threading.Thread(target=run_collector_loop, args=(rss_service, streaming_service.stop_event), daemon=True)
+            collector_thread.start()
+            streaming_service.run_queue(feeds_queue)
+        else:
+            streaming_service.run_change_stream()
+    except KeyboardInterrupt:
+        streaming_service.stop()
+        logger.info("Streaming analysis stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# metrics.py
+"""
+Process-wide metrics registry shared by collectors, analyzers and the Mongo DAO.
+Worker processes report through their parent: see MetricsRegistry.collect/merge.
+Counters and histograms are exported in OpenMetrics text format, either as a textfile for the
+node-exporter textfile collector (METRICS_TEXTFILE_DIR) or through an HTTP endpoint in
+daemon mode (METRICS_HTTP_PORT). PROFILE_DIR enables a cProfile + tracemalloc dump per run.
+"""
+
+import cProfile
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_HTTP_PORT, METRICS_TEXTFILE_DIR, PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache lookups up to multi-minute stages
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: dict | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values, strict=True)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in (extra or {}).items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self, reset: bool = False) -> dict:
+        """Copy of the values per label key; reset=True clears them, so repeated calls return deltas"""
+        with self._lock:
+            values = {key: self._copy_value(value) for key, value in self._values.items()}
+            if reset:
+                self._values.clear()
+        return values
+
+    def merge(self, values: dict):
+        """Add values collected from another process"""
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._merge_value(self._values.get(key), value)
+
+    def render(self) -> list[str]:
+        lines = [f"# TYPE {self.name} {self.type_name}", f"# HELP {self.name} {_escape(self.documentation)}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _copy_value(self, value):
+        return value
+
+    def _merge_value(self, current, value):
+        return (current or 0) + value
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _copy_value(self, state):
+        return {"buckets": list(state["buckets"]), "sum": state["sum"], "count": state["count"]}
+
+    def _merge_value(self, current, state):
+        if current is None:
+            return self._copy_value(state)
+        return {
+            "buckets": [a + b for a, b in zip(current["buckets"], state["buckets"], strict=True)],
+            "sum": current["sum"] + state["sum"],
+            "count": current["count"] + state["count"],
+        }
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["buckets"], strict=True):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self, reset: bool = False) -> dict:
+        """
+        Values of every metric by name, picklable. Worker processes have their own registry:
+        they return collect(reset=True) with their results and the parent merge()s it, so
+        spawned shards and pools are reported by the parent's export.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: values for metric in metrics if (values := metric.collect(reset))}
+
+    def merge(self, collected: dict):
+        """Add values collected by another process's registry; metrics unknown here are skipped"""
+        for name, values in collected.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is None:
+                logger.warning(f"Skipping values of unregistered metric '{name}'")
+                continue
+            metric.merge(values)
+
+    def render(self) -> str:
+        """All metrics in OpenMetrics text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines + ["# EOF"]) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ---------------- Shared metrics ----------------
+
+ITEMS_PROCESSED = REGISTRY.counter("items_processed", "Items handled by collectors and analyzers", ("component", "outcome"))
+STAGE_SECONDS = REGISTRY.histogram("stage_duration_seconds", "Duration of pipeline stages and per-source collection steps", ("component", "stage"))
+MONGO_OP_SECONDS = REGISTRY.histogram("mongo_operation_duration_seconds", "Latency of MongoManagerDAO operations", ("operation", "collection"))
+MONGO_BATCH_SIZE = REGISTRY.histogram("mongo_batch_size", "Documents per MongoManagerDAO batch operation", ("operation", "collection"), buckets=SIZE_BUCKETS)
+INFERENCE_BATCH_SECONDS = REGISTRY.histogram("inference_batch_duration_seconds", "Latency of one model inference batch", ("component", "backend"))
+INFERENCE_BATCH_SIZE = REGISTRY.histogram("inference_batch_size", "Texts per model inference batch", ("component", "backend"), buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = REGISTRY.counter("prediction_cache_lookups", "Prediction cache lookups by tier result", ("namespace", "result"))
+
+
+def timed_mongo_operation(operation: str):
+    """Decorator for MongoManagerDAO methods taking a collection_name argument"""
+
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            collection_name = signature.bind(*args, **kwargs).arguments.get("collection_name", "")
+            with MONGO_OP_SECONDS.time(operation=operation, collection=collection_name):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ---------------- Export ----------------
+
+
+def write_textfile(job: str, directory: str | None = METRICS_TEXTFILE_DIR) -> str | None:
+    """Atomically write all metrics to <directory>/<job>.prom for the node-exporter textfile collector"""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{job}.prom")
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(REGISTRY.render())
+    os.replace(temporary_path, path)
+    logger.info(f"Metrics written to {path}")
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line each
+        pass
+
+
+def start_http_server(port: int | None = METRICS_HTTP_PORT, host: str = "0.0.0.0") -> ThreadingHTTPServer | None:
+    """Serve /metrics from a daemon thread (daemon mode); disabled when no port is configured"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+# ---------------- Profiling ----------------
+
+
+@contextmanager
+def profile_run(job: str, directory: str | None = PROFILE_DIR, top_allocations: int = 30):
+    """Dump a cProfile .pstats file and the top tracemalloc allocation sites for the block, when enabled"""
+    if not directory:
+        yield
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"{job}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(f"{prefix}.pstats")
+        with open(f"{prefix}.alloc.txt", "w", encoding="utf-8") as allocations_file:
+            allocations_file.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB\n")
+            for statistic in snapshot.statistics("lineno")[:top_allocations]:
+                allocations_file.write(f"{statistic}\n")
+        logger.info(f"Profile written to {prefix}.pstats and {prefix}.alloc.txt")
+
+
+@contextmanager
+def run_metrics(job: str):
+    """Wrap a batch entry point: optional profiling, and a textfile export when the run ends"""
+    start = time.perf_counter()
+    try:
+        with profile_run(job):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, component=job, stage="run")
+        write_textfile(job)
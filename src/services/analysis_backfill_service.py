@@ -0,0 +1,68 @@
+import logging
+from datetime import datetime
+
+from dao.mongo_manager_dao import MongoManagerDAO
+
+logger = logging.getLogger(__name__)
+
+BACKFILLS_COLLECTION = "analysis_backfills"
+
+
+class AnalysisBackfillTracker:
+    """
+    Tracks the re-analysis of already processed feeds when the analysis version changes
+    (a new best sentiment model, a new topic extractor configuration...).
+    One record per (analysis, version) in 'analysis_backfills', resumed across runs until finished.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, analysis: str, version: str):
+        self.mongo_manager = mongo_manager
+        self.analysis = analysis
+        self.version = version
+        self.backfill_id = None
+
+    def start(self, total: int):
+        """Create the backfill record, or resume the unfinished one for this version"""
+        existing = self.mongo_manager.find_one(
+            {"analysis": self.analysis, "version": self.version, "status": "running"},
+            BACKFILLS_COLLECTION,
+        )
+
+        if existing:
+            self.backfill_id = existing["_id"]
+            self.mongo_manager.update_one({"_id": self.backfill_id}, {"$set": {"remaining": total, "resumed_at": datetime.now()}}, BACKFILLS_COLLECTION)
+            logger.info(f"Resuming {self.analysis} backfill to '{self.version}': {existing['processed']} done, {total} remaining")
+            return self.backfill_id
+
+        self.backfill_id = self.mongo_manager.insert_one(
+            {
+                "analysis": self.analysis,
+                "version": self.version,
+                "status": "running",
+                "total": total,
+                "remaining": total,
+                "processed": 0,
+                "started_at": datetime.now(),
+                "finished_at": None,
+            },
+            BACKFILLS_COLLECTION,
+        )
+        logger.info(f"Started {self.analysis} backfill to '{self.version}': {total} feeds to re-analyze")
+        return self.backfill_id
+
+    def advance(self, count: int):
+        """Record that count more stale feeds were re-analyzed"""
+        if self.backfill_id is None or not count:
+            return
+        self.mongo_manager.update_one({"_id": self.backfill_id}, {"$inc": {"processed": count, "remaining": -count}}, BACKFILLS_COLLECTION)
+
+    def finish(self):
+        """Mark the backfill as completed"""
+        if self.backfill_id is None:
+            return
+        self.mongo_manager.update_one(
+            {"_id": self.backfill_id},
+            {"$set": {"status": "completed", "remaining": 0, "finished_at": datetime.now()}},
+            BACKFILLS_COLLECTION,
+        )
+        logger.info(f"Completed {self.analysis} backfill to '{self.version}'")
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import re
+
+from pymongo import UpdateOne
+
+from services.analysis_backfill_service import BACKFILLS_COLLECTION, AnalysisBackfillTracker
+
+logger = logging.getLogger(__name__)
+
+# Item fields combined into the analysis text, in order
+ANALYSIS_TEXT_FIELDS = ("title", "description", "content", "summary")
+
+# Projection shared by the analyzers: the canonical text plus the fields they copy into results
+ANALYSIS_PROJECTION = {"analysis_text": 1, "analysis_text_hash": 1, "title": 1, "source": 1, "pubDate": 1}
+
+# Stored on every document with its analysis_text; bump it when build_analysis_text changes
+# so backfill_analysis_text recomputes the stored text and hash
+ANALYSIS_TEXT_VERSION = "v2"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_segment(text: str | None) -> str:
+    """Collapse whitespace and strip trailing sentence separators"""
+    return _WHITESPACE.sub(" ", text or "").strip().rstrip(". ")
+
+
+def build_analysis_text(item: dict) -> str:
+    """
+    Canonical text analyzed for an RSS item: title, description, content and summary joined
+    as sentences, skipping empty segments and exact duplicates. A segment that is a prefix or
+    suffix of the previous one is skipped, and one that extends the previous one replaces it
+    (summary and description are frequently the same text, or a prefix of the content).
+    A segment that only appears inside another one is kept, so a short title is never lost.
+    """
+    segments = []
+    for field in ANALYSIS_TEXT_FIELDS:
+        segment = normalize_segment(item.get(field))
+        if not segment or segment in segments:
+            continue
+        previous = segments[-1] if segments else None
+        if previous and (previous.startswith(segment) or previous.endswith(segment)):
+            continue
+        if previous and (segment.startswith(previous) or segment.endswith(previous)):
+            segments[-1] = segment
+        else:
+            segments.append(segment)
+    return ". ".join(segments)
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def analysis_text_fields(item: dict) -> dict:
+    """analysis_text, its content hash, its length and builder version, as stored on rss_feeds_data documents"""
+    text = build_analysis_text(item)
+    return {
+        "analysis_text": text,
+        "analysis_text_hash": _hash_text(text),
+        "analysis_text_length": len(text),
+        "analysis_text_version": ANALYSIS_TEXT_VERSION,
+    }
+
+
+def analysis_text_cache_key(item: dict, max_chars: int) -> str:
+    """
+    Prediction cache key of the first max_chars of an item's analysis_text: the hash stored at
+    ingest, computed here only for items loaded without it
+    """
+    full_hash = item.get("analysis_text_hash")
+    if full_hash is None:
+        text = item.get("analysis_text")
+        full_hash = _hash_text(text if text is not None else build_analysis_text(item))
+    return f"{full_hash}:{max_chars}"
+
+
+def backfill_analysis_text(mongo_manager, collection_name: str = "rss_feeds_data", batch_size: int = 1000, force: bool = False) -> int:
+    """
+    (Re)compute analysis_text and its hash for documents stored without it or by an older
+    ANALYSIS_TEXT_VERSION of the builder. Runs once per version: once it completed, later calls
+    return without scanning the collection (every ingest path stores the current version),
+    unless force is set. Archived stubs are rebuilt from their rehydrated fields; the new text
+    goes back to cold storage on the next retention run.
+    """
+    analysis = f"analysis_text:{collection_name}"
+    completed = mongo_manager.find_one({"analysis": analysis, "version": ANALYSIS_TEXT_VERSION, "status": "completed"}, BACKFILLS_COLLECTION)
+    if completed and not force:
+        return 0
+
+    query = {"analysis_text_version": {"$ne": ANALYSIS_TEXT_VERSION}}
+    tracker = AnalysisBackfillTracker(mongo_manager, analysis, ANALYSIS_TEXT_VERSION)
+    tracker.start(mongo_manager.count_documents(query, collection_name))
+
+    projection = {field: 1 for field in ANALYSIS_TEXT_FIELDS}
+    updated = 0
+    last_id = None
+    while True:
+        page_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+        items = mongo_manager.find(page_query, collection_name, sort=[("_id", 1)], projection=projection, limit=batch_size)
+        if not items:
+            break
+        mongo_manager.bulk_write([UpdateOne({"_id": item["_id"]}, {"$set": analysis_text_fields(item)}) for item in items], collection_name)
+        tracker.advance(len(items))
+        updated += len(items)
+        last_id = items[-1]["_id"]
+
+    tracker.finish()
+    logger.info(f"Computed analysis_text {ANALYSIS_TEXT_VERSION} for {updated} documents in '{collection_name}'")
+    return updated
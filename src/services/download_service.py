@@ -1,6 +1,14 @@
+import logging
+
+from pymongo.errors import OperationFailure
+
 from clients.selenium_client import SeleniumClient
+from config import BYMA_COLLECTION
 from dao.file_manager_dao import FileManagerDAO
 from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import ITEMS_PROCESSED, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
 
 
 class DownloadService:
@@ -9,19 +17,23 @@ class DownloadService:
         selenium_client: SeleniumClient,
         file_manager: FileManagerDAO,
         mongo_manager: MongoManagerDAO,
+        collection_name: str = BYMA_COLLECTION,
     ):
         self.selenium_client = selenium_client
         self.file_manager = file_manager
         self.mongo_manager = mongo_manager
+        self.collection_name = collection_name
+        self._index_ready = False
 
     def download_and_store(self, urls: list):
         for url, filename in urls:
             existing_files = self.file_manager.get_existing_csvs()
 
             # Selenium actions
-            self.selenium_client.get_page(url)
-            self.selenium_client.click_download_button()
-            downloaded_file = self.selenium_client.wait_for_new_file(existing_files)
+            with STAGE_SECONDS.time(component="download_service", stage="download"):
+                self.selenium_client.get_page(url)
+                self.selenium_client.click_download_button()
+                downloaded_file = self.selenium_client.wait_for_new_file(existing_files)
 
             # File actions
             final_path = self.file_manager.move_file(downloaded_file, filename)
@@ -29,4 +41,24 @@ class DownloadService:
             df = self.file_manager.normalize_headers(df)
 
             # Mongo actions
-            self.mongo_manager.insert_dataframe(df)
+            self._store(df)
+            ITEMS_PROCESSED.inc(len(df), component="download_service", outcome="inserted")
+
+    def _store(self, df):
+        """Upsert rows by (ticker, date), so downloading the same history again does not append it twice"""
+        date_field = "date" if "date" in df.columns else "timestamp"
+        if "ticker" not in df.columns or date_field not in df.columns:
+            logger.warning(f"No ticker/date columns in download, inserting {len(df)} rows without deduplication")
+            self.mongo_manager.insert_dataframe(df, self.collection_name)
+            return
+
+        key_fields = ["ticker", date_field]
+        if not self._index_ready:
+            try:
+                self.mongo_manager.create_index([(field, 1) for field in key_fields], self.collection_name, unique=True)
+            except OperationFailure as e:
+                # Rows appended by older insert-only runs prevent the unique index
+                logger.warning(f"Could not create unique {tuple(key_fields)} index, using a regular one: {e}")
+                self.mongo_manager.create_index([(field, 1) for field in key_fields], self.collection_name)
+            self._index_ready = True
+        self.mongo_manager.bulk_upsert(df.to_dict(orient="records"), key_fields, self.collection_name)
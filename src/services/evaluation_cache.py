@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+from dao.mongo_manager_dao import MongoManagerDAO
+from services.prediction_cache import text_hash
+
+logger = logging.getLogger(__name__)
+
+EVALUATIONS_COLLECTION = "sentiment_model_evaluations"
+
+# Subdirectories of a model directory holding artifacts derived from the checkpoint (the ONNX
+# exports of main_export_sentiment_model_onnx), left out of its fingerprint
+DERIVED_MODEL_DIRS = ("onnx",)
+
+
+def test_set_fingerprint(test_data: list[dict]) -> str:
+    """
+    Content hash of a labeled test set, independent of document order. Cached results are
+    therefore joined back to the examples by text_hash, not by position.
+    """
+    examples = sorted(json.dumps([item["text"], item["label"]], ensure_ascii=False) for item in test_data)
+    return text_hash("\n".join(examples))
+
+
+def model_fingerprint(model_path: str) -> str:
+    """
+    Fingerprint of a model directory from the relative path, size and modification time of
+    every file, so checking an unchanged checkpoint does not read its weights. Exporting the
+    model (DERIVED_MODEL_DIRS) does not change it.
+    """
+    entries = []
+    for root, dirs, files in os.walk(model_path):
+        if root == model_path:
+            dirs[:] = [name for name in dirs if name not in DERIVED_MODEL_DIRS]
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            entries.append(f"{os.path.relpath(path, model_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    if not entries:
+        raise ValueError(f"No model files found in: {model_path}")
+    return text_hash("\n".join(entries))
+
+
+class EvaluationCache:
+    """
+    Evaluation results (metrics and per-example predictions) stored in 'sentiment_model_evaluations',
+    keyed by (model_id, model fingerprint, test set fingerprint).
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO):
+        self.mongo_manager = mongo_manager
+        self.mongo_manager.create_index([("model_id", 1), ("model_fingerprint", 1), ("test_set_fingerprint", 1)], EVALUATIONS_COLLECTION, unique=True)
+
+    def get(self, model_id, model_fp: str, test_set_fp: str) -> dict | None:
+        query = {"model_id": model_id, "model_fingerprint": model_fp, "test_set_fingerprint": test_set_fp}
+        return self.mongo_manager.find_one(query, EVALUATIONS_COLLECTION)
+
+    def put(self, model_id, model_fp: str, test_set_fp: str, evaluation: dict):
+        record = {
+            "model_id": model_id,
+            "model_fingerprint": model_fp,
+            "test_set_fingerprint": test_set_fp,
+            **evaluation,
+            "evaluated_at": datetime.now(),
+        }
+        self.mongo_manager.bulk_upsert([record], ["model_id", "model_fingerprint", "test_set_fingerprint"], EVALUATIONS_COLLECTION)
+        logger.info(f"Stored evaluation of model {model_id} in '{EVALUATIONS_COLLECTION}'")
@@ -0,0 +1,203 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import BYMA_COLLECTION, INDICATORS_COLLECTION, INDICATORS_WARMUP_BARS
+from dao.mongo_manager_dao import MongoManagerDAO
+
+logger = logging.getLogger(__name__)
+
+# Timeframe name -> pandas resample rule (None means raw daily rows)
+TIMEFRAMES = {"1d": None, "1w": "W-FRI", "1M": "MS"}
+
+OHLCV_AGGREGATIONS = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+
+# ---------------- Vectorized indicators ----------------
+
+
+def sma(values: np.ndarray, period: int) -> np.ndarray:
+    """Simple moving average, NaN until the first full window"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1 :] = sliding_window_view(values, period).mean(axis=1)
+    return out
+
+
+def ema(values: np.ndarray, period: int, wilder: bool = False) -> np.ndarray:
+    """Exponential moving average (Wilder smoothing uses alpha=1/period)"""
+    series = pd.Series(values, dtype="float64")
+    if wilder:
+        smoothed = series.ewm(alpha=1 / period, adjust=False, min_periods=period)
+    else:
+        smoothed = series.ewm(span=period, adjust=False, min_periods=period)
+    return smoothed.mean().to_numpy()
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Relative Strength Index with Wilder smoothing"""
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+
+    delta = np.diff(close)
+    avg_gain = ema(np.clip(delta, 0, None), period, wilder=True)
+    avg_loss = ema(np.clip(-delta, 0, None), period, wilder=True)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + rs))
+
+    out[1:] = values
+    return out
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD line, signal line and histogram"""
+    macd_line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(macd_line, signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def bollinger(close: np.ndarray, period: int = 20, num_std: float = 2.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bollinger bands (upper, middle, lower) using population standard deviation"""
+    middle = sma(close, period)
+    std = np.full(len(close), np.nan)
+    if len(close) >= period:
+        std[period - 1 :] = sliding_window_view(close, period).std(axis=1)
+    return middle + num_std * std, middle, middle - num_std * std
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Average True Range with Wilder smoothing"""
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ema(true_range, period, wilder=True)
+
+
+def compute_indicators(bars: pd.DataFrame) -> pd.DataFrame:
+    """Compute all indicators over a bar DataFrame indexed by date"""
+    close = bars["close"].to_numpy(dtype="float64")
+    high = bars["high"].to_numpy(dtype="float64")
+    low = bars["low"].to_numpy(dtype="float64")
+
+    result = bars.copy()
+    result["sma_20"] = sma(close, 20)
+    result["sma_50"] = sma(close, 50)
+    result["ema_12"] = ema(close, 12)
+    result["ema_26"] = ema(close, 26)
+    result["rsi_14"] = rsi(close, 14)
+    result["macd"], result["macd_signal"], result["macd_hist"] = macd(close)
+    result["bb_upper"], result["bb_middle"], result["bb_lower"] = bollinger(close)
+    result["atr_14"] = atr(high, low, close, 14)
+    return result
+
+
+def resample_bars(daily: pd.DataFrame, rule: str | None) -> pd.DataFrame:
+    """Build OHLCV bars for a timeframe from daily rows indexed by date"""
+    if rule is None:
+        return daily
+    aggregations = {column: how for column, how in OHLCV_AGGREGATIONS.items() if column in daily.columns}
+    return daily.resample(rule).agg(aggregations).dropna(subset=["close"])
+
+
+# ---------------- Indicators Service ----------------
+
+
+class IndicatorsService:
+    def __init__(
+        self,
+        mongo_manager: MongoManagerDAO,
+        source_collection: str = BYMA_COLLECTION,
+        target_collection: str = INDICATORS_COLLECTION,
+        warmup_bars: int = INDICATORS_WARMUP_BARS,
+    ):
+        self.mongo_manager = mongo_manager
+        self.source_collection = source_collection
+        self.target_collection = target_collection
+        self.warmup_bars = warmup_bars
+        self.mongo_manager.create_index([("ticker", 1), ("timeframe", 1), ("date", 1)], self.target_collection, unique=True)
+
+    def _load_daily(self, ticker: str) -> pd.DataFrame:
+        """Load daily OHLCV rows for a ticker as a date-indexed DataFrame"""
+        projection = {"_id": 0, "date": 1, "timestamp": 1, **{column: 1 for column in OHLCV_AGGREGATIONS}}
+        rows = self.mongo_manager.find({"ticker": ticker}, self.source_collection, projection=projection)
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(rows)
+        date_column = "date" if "date" in df.columns else "timestamp"
+        df["date"] = pd.to_datetime(df[date_column])
+        df = df.dropna(subset=["date", "close"]).drop_duplicates(subset="date", keep="last")
+        columns = [column for column in OHLCV_AGGREGATIONS if column in df.columns]
+        return df.set_index("date").sort_index()[columns].astype("float64")
+
+    def _last_stored_date(self, ticker: str, timeframe: str) -> datetime | None:
+        last = self.mongo_manager.find(
+            {"ticker": ticker, "timeframe": timeframe},
+            self.target_collection,
+            sort=[("date", -1)],
+            projection={"date": 1},
+            limit=1,
+        )
+        return last[0]["date"] if last else None
+
+    def update_ticker(self, ticker: str) -> int:
+        """
+        Rebuild bars and indicators for a ticker in every timeframe.
+        Only the tail starting at the last stored bar is rewritten; indicators are
+        recomputed over that tail plus a warm-up window of previous bars.
+        """
+        daily = self._load_daily(ticker)
+        if daily.empty:
+            logger.warning(f"No daily rows found for ticker '{ticker}'")
+            return 0
+
+        written = 0
+        for timeframe, rule in TIMEFRAMES.items():
+            bars = resample_bars(daily, rule)
+            last_date = self._last_stored_date(ticker, timeframe)
+
+            if last_date is not None:
+                # The last stored bar may have been partial (current week/month), so it is rewritten too
+                tail_start = int(bars.index.searchsorted(pd.Timestamp(last_date)))
+                bars = bars.iloc[max(0, tail_start - self.warmup_bars) :]
+                result = compute_indicators(bars)
+                result = result[result.index >= pd.Timestamp(last_date)]
+            else:
+                result = compute_indicators(bars)
+
+            if result.empty:
+                continue
+
+            result = result.reset_index()
+            result["ticker"] = ticker
+            result["timeframe"] = timeframe
+            result["updated_at"] = datetime.now()
+            records = result.astype(object).where(result.notna(), None).to_dict(orient="records")
+            for record in records:
+                record["date"] = record["date"].to_pydatetime()
+
+            self.mongo_manager.bulk_upsert(records, ["ticker", "timeframe", "date"], self.target_collection)
+            written += len(records)
+            logger.info(f"Stored {len(records)} '{timeframe}' bars with indicators for '{ticker}'")
+
+        return written
+
+    def update_all(self) -> dict:
+        """Update bars and indicators for every ticker in the source collection"""
+        tickers = self.mongo_manager.distinct("ticker", self.source_collection)
+        logger.info(f"Computing indicators for {len(tickers)} tickers")
+
+        written = {}
+        for ticker in tickers:
+            try:
+                written[ticker] = self.update_ticker(ticker)
+            except Exception as e:
+                logger.error(f"Error computing indicators for '{ticker}': {e}")
+                continue
+
+        logger.info(f"Indicators stored in '{self.target_collection}': {sum(written.values())} bars")
+        return written
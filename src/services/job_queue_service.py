@@ -0,0 +1,224 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS
+from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import ITEMS_PROCESSED, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "job_queue"
+
+# Delay before the first retry of a failed job, doubled on every further attempt
+RETRY_DELAY_SECONDS = 30
+
+
+class JobQueue:
+    """
+    Mongo-backed work queue shared by every worker node. A job is claimed atomically with
+    find_one_and_update and leased to the claiming worker, which must heartbeat to keep the
+    lease. Jobs whose lease expired are re-queued (or failed once out of attempts), and
+    complete/fail only apply while the caller still holds the lease, so a worker that lost
+    its job cannot overwrite the outcome of the worker that took it over.
+    Leases compare timestamps taken on different nodes, so node clocks must be kept in sync.
+
+    States: queued -> running -> done | failed (running -> queued on retry or lease expiry).
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, lease_seconds: int = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.mongo_manager = mongo_manager
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.mongo_manager.create_index([("dedupe_key", 1)], JOBS_COLLECTION, unique=True)
+        self.mongo_manager.create_index([("status", 1), ("kind", 1), ("priority", -1), ("available_at", 1)], JOBS_COLLECTION)
+        self.mongo_manager.create_index([("status", 1), ("lease_expires_at", 1)], JOBS_COLLECTION)
+
+    def enqueue(self, kind: str, payload: dict, dedupe_key: str | None = None, priority: int = 0) -> tuple[dict, bool]:
+        """
+        Add a job unless one with the same dedupe_key is queued, running or done; a failed job
+        with that key is reset and queued again. Returns (job, created). Periodic work includes
+        its time window in the key.
+        """
+        enqueue_token = uuid.uuid4().hex
+        job_fields = {
+            "kind": kind,
+            "payload": payload,
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "enqueued_at": datetime.now(),
+            "available_at": datetime.now(),
+            "enqueue_token": enqueue_token,
+        }
+        query = {"dedupe_key": dedupe_key or f"{kind}:{ObjectId()}"}
+        try:
+            job = self.mongo_manager.find_one_and_update(query, {"$setOnInsert": job_fields}, JOBS_COLLECTION, upsert=True)
+        except DuplicateKeyError:
+            # Another node inserted the same key between our lookup and insert
+            return self.mongo_manager.find_one(query, JOBS_COLLECTION), False
+
+        if job["status"] == "failed":
+            # The key is unique, so the failed job document itself goes back to the queue
+            requeued = self.mongo_manager.find_one_and_update(
+                {**query, "status": "failed"},
+                {"$set": job_fields, "$unset": {"error": "", "result": "", "finished_at": "", "worker_id": ""}},
+                JOBS_COLLECTION,
+            )
+            if requeued is not None:
+                job = requeued
+
+        created = job["enqueue_token"] == enqueue_token
+        if created:
+            logger.info(f"Enqueued {kind} job {job['_id']} ({job['dedupe_key']})")
+        return job, created
+
+    def claim(self, worker_id: str, kinds: list[str] | None = None) -> dict | None:
+        """Lease the highest priority available job to worker_id, or return None if there is none"""
+        now = datetime.now()
+        query = {"status": "queued", "available_at": {"$lte": now}}
+        if kinds:
+            query["kind"] = {"$in": list(kinds)}
+        update = {
+            "$set": {
+                "status": "running",
+                "worker_id": worker_id,
+                "lease_token": uuid.uuid4().hex,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "started_at": now,
+                "heartbeat_at": now,
+            },
+            "$inc": {"attempts": 1},
+        }
+        return self.mongo_manager.find_one_and_update(query, update, JOBS_COLLECTION, sort=[("priority", -1), ("available_at", 1)])
+
+    def _leased(self, job: dict) -> dict:
+        return {"_id": job["_id"], "status": "running", "lease_token": job["lease_token"]}
+
+    def heartbeat(self, job: dict) -> bool:
+        """Extend the lease; False means it expired and the job may belong to another worker now"""
+        now = datetime.now()
+        update = {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds), "heartbeat_at": now}}
+        return self.mongo_manager.update_one(self._leased(job), update, JOBS_COLLECTION).matched_count == 1
+
+    def complete(self, job: dict, result: dict | None = None) -> bool:
+        """Mark a leased job done. Repeating the call for a job already done is a no-op that returns True."""
+        update = {"$set": {"status": "done", "result": result, "finished_at": datetime.now()}, "$unset": {"lease_token": ""}}
+        if self.mongo_manager.update_one(self._leased(job), update, JOBS_COLLECTION).matched_count:
+            return True
+
+        current = self.mongo_manager.find_one({"_id": job["_id"]}, JOBS_COLLECTION)
+        if current and current["status"] == "done":
+            return True
+        logger.warning(f"Job {job['_id']} not completed: its lease was lost")
+        return False
+
+    def fail(self, job: dict, error: str) -> bool:
+        """Re-queue a leased job with exponential backoff, or mark it failed once out of attempts"""
+        now = datetime.now()
+        if job["attempts"] >= self.max_attempts:
+            update = {"$set": {"status": "failed", "error": error, "finished_at": now}, "$unset": {"lease_token": ""}}
+        else:
+            retry_at = now + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** (job["attempts"] - 1))
+            update = {"$set": {"status": "queued", "last_error": error, "available_at": retry_at}, "$unset": {"lease_token": "", "worker_id": ""}}
+        return self.mongo_manager.update_one(self._leased(job), update, JOBS_COLLECTION).matched_count == 1
+
+    def requeue_expired(self) -> int:
+        """Return jobs whose worker stopped heartbeating to the queue; those out of attempts are failed"""
+        now = datetime.now()
+        expired = {"status": "running", "lease_expires_at": {"$lt": now}}
+        failed = self.mongo_manager.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "error": "lease expired", "finished_at": now}, "$unset": {"lease_token": ""}},
+            JOBS_COLLECTION,
+        ).modified_count
+        requeued = self.mongo_manager.update_many(
+            expired,
+            {"$set": {"status": "queued", "last_error": "lease expired", "available_at": now}, "$unset": {"lease_token": "", "worker_id": ""}},
+            JOBS_COLLECTION,
+        ).modified_count
+        if failed or requeued:
+            logger.warning(f"Expired leases: {requeued} jobs re-queued, {failed} failed")
+        return requeued
+
+    def counts(self) -> dict:
+        """Number of jobs per (kind, status)"""
+        rows = self.mongo_manager.aggregate([{"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}}], JOBS_COLLECTION)
+        return {f"{row['_id']['kind']}/{row['_id']['status']}": row["count"] for row in rows}
+
+
+class JobWorker:
+    """
+    Claims jobs of the given kinds and runs handlers[kind](job) -> result dict, heartbeating
+    from a background thread while the handler runs. Handlers must be safe to run twice for
+    the same job, since a job is re-run when its worker dies before completing it.
+    """
+
+    def __init__(self, job_queue: JobQueue, handlers: dict, worker_id: str | None = None, poll_seconds: float = JOB_POLL_SECONDS):
+        self.job_queue = job_queue
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _heartbeat_loop(self, job: dict, done: threading.Event):
+        while not done.wait(self.job_queue.lease_seconds / 3):
+            if not self.job_queue.heartbeat(job):
+                logger.warning(f"Lost the lease of job {job['_id']} while running it")
+                return
+
+    def run_job(self, job: dict) -> bool:
+        """Run one claimed job and record its outcome; returns True if it completed"""
+        logger.info(f"Running {job['kind']} job {job['_id']} (attempt {job['attempts']})")
+        done = threading.Event()
+        heartbeat_thread = threading.Thread(target=self._heartbeat_loop, args=(job, done), name=f"heartbeat-{job['_id']}", daemon=True)
+        heartbeat_thread.start()
+        start_time = time.monotonic()
+        try:
+            with STAGE_SECONDS.time(component="job_worker", stage=job["kind"]):
+                result = self.handlers[job["kind"]](job)
+        except Exception as e:
+            logger.exception(f"{job['kind']} job {job['_id']} failed: {e}")
+            self.job_queue.fail(job, str(e))
+            ITEMS_PROCESSED.inc(component="job_worker", outcome="failed")
+            return False
+        finally:
+            done.set()
+            heartbeat_thread.join()
+
+        completed = self.job_queue.complete(job, result)
+        ITEMS_PROCESSED.inc(component="job_worker", outcome="done" if completed else "lease_lost")
+        logger.info(f"{job['kind']} job {job['_id']} finished in {time.monotonic() - start_time:.1f} seconds: {result}")
+        return completed
+
+    def run(self, drain: bool = False, max_jobs: int | None = None) -> int:
+        """
+        Process jobs until stop() is called. With drain=True, return as soon as no job is
+        available. Returns the number of jobs run.
+        """
+        kinds = list(self.handlers)
+        logger.info(f"Worker {self.worker_id} processing job kinds: {kinds}")
+        jobs_run = 0
+        while not self.stop_event.is_set() and (max_jobs is None or jobs_run < max_jobs):
+            self.job_queue.requeue_expired()
+            job = self.job_queue.claim(self.worker_id, kinds)
+            if job is None:
+                if drain:
+                    break
+                self.stop_event.wait(self.poll_seconds)
+                continue
+            self.run_job(job)
+            jobs_run += 1
+
+        logger.info(f"Worker {self.worker_id} stopped after {jobs_run} jobs")
+        return jobs_run
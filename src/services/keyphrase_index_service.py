@@ -0,0 +1,215 @@
+import logging
+import math
+import re
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+
+from pymongo import UpdateOne
+
+from config import KEYPHRASE_TREND_HALF_LIFE_HOURS
+from dao.mongo_manager_dao import MongoManagerDAO
+
+logger = logging.getLogger(__name__)
+
+POSTINGS_COLLECTION = "keyphrase_postings"
+COUNTS_COLLECTION = "keyphrase_counts"
+TRENDS_COLLECTION = "keyphrase_trends"
+
+# Reference time for decayed scores; only differences matter
+TREND_EPOCH = datetime(2024, 1, 1)
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Normalize a keyphrase for indexing: case folded, single spaced"""
+    return re.sub(r"\s+", " ", phrase).strip().casefold()
+
+
+def _hours_since_epoch(moment: datetime) -> float:
+    return (moment - TREND_EPOCH).total_seconds() / 3600
+
+
+def parse_pub_date(value) -> datetime | None:
+    """Feed publication date (RFC 822 as served by feeds, or ISO) as a naive local datetime, or None"""
+    if isinstance(value, datetime):
+        published = value
+    elif isinstance(value, str) and value.strip():
+        try:
+            published = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            try:
+                published = datetime.fromisoformat(value.strip())
+            except ValueError:
+                return None
+    else:
+        return None
+    if published.tzinfo is not None:
+        published = published.astimezone().replace(tzinfo=None)
+    return published
+
+
+class KeyphraseIndex:
+    """
+    Persistent inverted index from normalized keyphrase to feedIds, maintained as topic analyses are written:
+    - keyphrase_postings: one document per (phrase, feedId)
+    - keyphrase_counts: exact mention counts per phrase in hourly and daily buckets of the feed's
+      publication date (pubDate, falling back to the analysis date)
+    - keyphrase_trends: exponentially time-decayed score per phrase, stored in log space relative to
+      TREND_EPOCH so that sorting on log_score ranks phrases by their current decayed score
+    Counts and trends are derived from the postings of the phrases touched by each batch rather
+    than incremented, so re-analyzing a feed, retrying a batch that failed after its postings were
+    written, or two runs indexing concurrently all converge on the same values. Postings are never
+    removed, so a stored value is only replaced by one computed from at least as many postings.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, half_life_hours: float = KEYPHRASE_TREND_HALF_LIFE_HOURS):
+        self.mongo_manager = mongo_manager
+        self.decay_per_hour = math.log(2) / half_life_hours
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        self.mongo_manager.create_index([("phrase", 1), ("feedId", 1)], POSTINGS_COLLECTION, unique=True)
+        self.mongo_manager.create_index([("phrase", 1), ("published_at", -1)], POSTINGS_COLLECTION)
+        self.mongo_manager.create_index([("phrase", 1), ("hour", 1)], POSTINGS_COLLECTION)
+        self.mongo_manager.create_index([("phrase", 1), ("day", 1)], POSTINGS_COLLECTION)
+        self.mongo_manager.create_index([("granularity", 1), ("bucket", 1), ("phrase", 1)], COUNTS_COLLECTION, unique=True)
+        self.mongo_manager.create_index([("phrase", 1)], TRENDS_COLLECTION, unique=True)
+        self.mongo_manager.create_index([("log_score", -1)], TRENDS_COLLECTION)
+        self._indexes_ready = True
+
+    def index_analyses(self, analyses: list[dict]):
+        """Add the keyphrases of topic analysis documents to the index and refresh the counters of their phrases"""
+        if not analyses:
+            return
+        self.ensure_indexes()
+
+        now = datetime.now()
+        postings = []
+        for analysis in analyses:
+            analysis_date = analysis.get("analysis_date") or now
+            # Mentions are counted when the news was published, so a backfill over old feeds
+            # does not land in the current hour; future dates (clock skew) are clamped to now
+            published_at = min(parse_pub_date(analysis.get("pubDate")) or analysis_date, now)
+            hour = published_at.replace(minute=0, second=0, microsecond=0)
+            for phrase in dict.fromkeys(normalize_phrase(kp["phrase"]) for kp in analysis["keyphrases"]):
+                postings.append(
+                    {
+                        "phrase": phrase,
+                        "feedId": analysis["feedId"],
+                        "analysis_date": analysis_date,
+                        "published_at": published_at,
+                        "hour": hour,
+                        "day": hour.replace(hour=0),
+                    }
+                )
+        if not postings:
+            return
+
+        operations = [UpdateOne({"phrase": p["phrase"], "feedId": p["feedId"]}, {"$setOnInsert": p}, upsert=True) for p in postings]
+        result = self.mongo_manager.bulk_write(operations, POSTINGS_COLLECTION)
+
+        # Every bucket and phrase of the batch is refreshed, not only those of new postings, so a
+        # retry after a failure between these writes restores what the failed attempt missed
+        for granularity in ("hour", "day"):
+            self._refresh_counts(granularity, {(posting[granularity], posting["phrase"]) for posting in postings})
+        self._refresh_trends({posting["phrase"] for posting in postings})
+        logger.info(f"Indexed {len(result.upserted_ids)} new keyphrase mentions from {len(analyses)} analyses")
+
+    def _refresh_counts(self, granularity: str, buckets: set):
+        """Recompute the mention count of (bucket, phrase) pairs from the postings"""
+        pipeline = [
+            {"$match": {"phrase": {"$in": sorted({phrase for _, phrase in buckets})}, granularity: {"$in": sorted({bucket for bucket, _ in buckets})}}},
+            {"$group": {"_id": {"bucket": f"${granularity}", "phrase": "$phrase"}, "count": {"$sum": 1}}},
+        ]
+        counts = {(row["_id"]["bucket"], row["_id"]["phrase"]): row["count"] for row in self.mongo_manager.aggregate(pipeline, POSTINGS_COLLECTION)}
+        operations = [
+            UpdateOne({"granularity": granularity, "bucket": bucket, "phrase": phrase}, {"$max": {"count": counts[(bucket, phrase)]}}, upsert=True)
+            for bucket, phrase in buckets
+            if (bucket, phrase) in counts
+        ]
+        self.mongo_manager.bulk_write(operations, COUNTS_COLLECTION)
+
+    def _refresh_trends(self, phrases: set):
+        """Recompute the decayed score of phrases from the publication dates of their postings"""
+        # Scores are summed relative to the current offset: every posting is at or before now, so
+        # exp() cannot overflow, and only mentions decades old underflow (their max is used then)
+        log_offset = self._log_offset()
+        hours_since_epoch = {"$divide": [{"$subtract": ["$published_at", TREND_EPOCH]}, 3600 * 1000]}
+        log_score = {"$multiply": [self.decay_per_hour, hours_since_epoch]}
+        pipeline = [
+            {"$match": {"phrase": {"$in": sorted(phrases)}}},
+            {"$set": {"log_score": log_score}},
+            {
+                "$group": {
+                    "_id": "$phrase",
+                    "mentions": {"$sum": 1},
+                    "max_log_score": {"$max": "$log_score"},
+                    "scaled_sum": {"$sum": {"$exp": {"$subtract": ["$log_score", log_offset]}}},
+                }
+            },
+        ]
+        operations = []
+        for row in self.mongo_manager.aggregate(pipeline, POSTINGS_COLLECTION):
+            if row["max_log_score"] is None:
+                continue
+            score = log_offset + math.log(row["scaled_sum"]) if row["scaled_sum"] > 0 else row["max_log_score"]
+            operations.append(UpdateOne({"phrase": row["_id"]}, self._set_trend_pipeline(score, row["mentions"]), upsert=True))
+        self.mongo_manager.bulk_write(operations, TRENDS_COLLECTION)
+
+    def _log_offset(self) -> float:
+        # Log of the decay factor at the current time, to turn stored log scores into current scores
+        return self.decay_per_hour * _hours_since_epoch(datetime.now())
+
+    @staticmethod
+    def _set_trend_pipeline(log_score: float, mentions: int) -> list:
+        """Update pipeline storing a recomputed score, unless the stored one was computed from more postings"""
+        stale = {"$gt": [{"$ifNull": ["$mentions", -1]}, mentions]}
+        return [
+            {
+                "$set": {
+                    "log_score": {"$cond": [stale, "$log_score", log_score]},
+                    "mentions": {"$max": [{"$ifNull": ["$mentions", 0]}, mentions]},
+                    "updated_at": "$$NOW",
+                }
+            }
+        ]
+
+    # ---------------- Queries ----------------
+
+    def top_trending_phrases(self, limit: int = 10) -> list[dict]:
+        """Phrases with the highest time-decayed mention score right now"""
+        offset = self._log_offset()
+        trends = self.mongo_manager.find({}, TRENDS_COLLECTION, sort=[("log_score", -1)], projection={"_id": 0, "phrase": 1, "log_score": 1}, limit=limit)
+        return [{"phrase": trend["phrase"], "score": math.exp(trend["log_score"] - offset)} for trend in trends]
+
+    def top_rising_phrases(self, hours: int = 24, limit: int = 10, min_count: int = 2) -> list[dict]:
+        """Phrases whose mentions in the last N hours grew the most compared to the N hours before"""
+        now = datetime.now()
+        recent_start = (now - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+        previous_start = recent_start - timedelta(hours=hours)
+
+        pipeline = [
+            {"$match": {"granularity": "hour", "bucket": {"$gte": previous_start}}},
+            {
+                "$group": {
+                    "_id": "$phrase",
+                    "recent_count": {"$sum": {"$cond": [{"$gte": ["$bucket", recent_start]}, "$count", 0]}},
+                    "previous_count": {"$sum": {"$cond": [{"$lt": ["$bucket", recent_start]}, "$count", 0]}},
+                }
+            },
+            {"$match": {"recent_count": {"$gte": min_count}}},
+            {"$set": {"growth": {"$divide": [{"$add": ["$recent_count", 1]}, {"$add": ["$previous_count", 1]}]}}},
+            {"$sort": {"growth": -1, "recent_count": -1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "phrase": "$_id", "recent_count": 1, "previous_count": 1, "growth": 1}},
+        ]
+        return self.mongo_manager.aggregate(pipeline, COUNTS_COLLECTION)
+
+    def feeds_mentioning(self, phrase: str, since: datetime | None = None, limit: int = 100) -> list:
+        """feedIds of the most recently published feeds mentioning a phrase, the same dates the counts are bucketed by"""
+        query = {"phrase": normalize_phrase(phrase)}
+        if since:
+            query["published_at"] = {"$gte": since}
+        postings = self.mongo_manager.find(query, POSTINGS_COLLECTION, sort=[("published_at", -1)], projection={"_id": 0, "feedId": 1}, limit=limit)
+        return [posting["feedId"] for posting in postings]
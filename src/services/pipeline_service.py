@@ -0,0 +1,148 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from bson import ObjectId
+
+from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+RUNS_COLLECTION = "pipeline_runs"
+
+
+class PipelineStage:
+    """A named unit of work; run(context) is called once all stages in depends_on succeeded"""
+
+    def __init__(self, name: str, run, depends_on: tuple = ()):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+
+
+class PipelineOrchestrator:
+    """
+    Runs stages as a dependency graph in a thread pool: a stage starts as soon as its
+    dependencies finished, so independent branches overlap. Stage state is checkpointed in
+    'pipeline_runs' after every transition; resuming a run skips stages that already succeeded
+    and retries the failed ones. Dependents of a failed stage are not run.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, stages: list[PipelineStage], max_workers: int | None = None):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicated stage names: {names}")
+        for stage in stages:
+            unknown = set(stage.depends_on) - set(names)
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {sorted(unknown)}")
+
+        self.mongo_manager = mongo_manager
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers or len(stages)
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    # ---------------- Checkpoints ----------------
+
+    def _start_run(self, resume_run_id=None) -> tuple[ObjectId, dict]:
+        """Create a run record, or load the stage states of the run being resumed"""
+        if resume_run_id is not None:
+            run = self.mongo_manager.find_one({"_id": resume_run_id}, RUNS_COLLECTION)
+            if not run:
+                raise ValueError(f"Pipeline run {resume_run_id} not found")
+            self.mongo_manager.update_one({"_id": resume_run_id}, {"$set": {"status": "running", "resumed_at": datetime.now()}}, RUNS_COLLECTION)
+            logger.info(f"Resuming pipeline run {resume_run_id}")
+            return resume_run_id, run.get("stages", {})
+
+        run_id = self.mongo_manager.insert_one(
+            {"status": "running", "started_at": datetime.now(), "stages": {name: {"status": "pending"} for name in self.stages}},
+            RUNS_COLLECTION,
+        )
+        logger.info(f"Started pipeline run {run_id}")
+        return run_id, {}
+
+    def last_unfinished_run_id(self):
+        runs = self.mongo_manager.find({"status": {"$ne": "success"}}, RUNS_COLLECTION, sort=[("started_at", -1)], projection={"_id": 1}, limit=1)
+        return runs[0]["_id"] if runs else None
+
+    def _checkpoint(self, run_id, name: str, state: dict):
+        self.mongo_manager.update_one({"_id": run_id}, {"$set": {f"stages.{name}": state}}, RUNS_COLLECTION)
+
+    # ---------------- Execution ----------------
+
+    def _run_stage(self, run_id, stage: PipelineStage, context) -> dict:
+        started_at = datetime.now()
+        self._checkpoint(run_id, stage.name, {"status": "running", "started_at": started_at})
+        logger.info(f"Stage '{stage.name}' started")
+        start_time = time.monotonic()
+
+        try:
+            with STAGE_SECONDS.time(component="pipeline", stage=stage.name):
+                result = stage.run(context)
+        except Exception as e:
+            state = {"status": "failed", "started_at": started_at, "finished_at": datetime.now(), "error": str(e)}
+            self._checkpoint(run_id, stage.name, state)
+            logger.exception(f"Stage '{stage.name}' failed after {time.monotonic() - start_time:.1f} seconds: {e}")
+            return state
+
+        state = {"status": "success", "started_at": started_at, "finished_at": datetime.now(), "result": result}
+        self._checkpoint(run_id, stage.name, state)
+        logger.info(f"Stage '{stage.name}' finished in {time.monotonic() - start_time:.1f} seconds")
+        return state
+
+    def run(self, context, resume_run_id=None) -> dict:
+        """Run every stage not completed yet; returns the final status of each stage"""
+        run_id, previous = self._start_run(resume_run_id)
+        status = {name: "success" if previous.get(name, {}).get("status") == "success" else "pending" for name in self.stages}
+        for name, stage_status in status.items():
+            if stage_status == "success":
+                logger.info(f"Stage '{name}' already completed in this run, skipping")
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as executor:
+            while True:
+                for name, stage in self.stages.items():
+                    if status[name] != "pending":
+                        continue
+                    dependency_status = {status[dependency] for dependency in stage.depends_on}
+                    if dependency_status & {"failed", "skipped"}:
+                        status[name] = "skipped"
+                        self._checkpoint(run_id, name, {"status": "skipped", "reason": "a dependency failed"})
+                        logger.warning(f"Stage '{name}' skipped: a dependency failed")
+                    elif dependency_status <= {"success"}:
+                        status[name] = "running"
+                        running[executor.submit(self._run_stage, run_id, stage, context)] = name
+
+                if not running:
+                    # Skipping a stage can unblock nothing, but may skip further dependents
+                    if "pending" in status.values():
+                        continue
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    status[running.pop(future)] = future.result()["status"]
+
+        run_status = "success" if set(status.values()) == {"success"} else "failed"
+        self.mongo_manager.update_one({"_id": run_id}, {"$set": {"status": run_status, "finished_at": datetime.now()}}, RUNS_COLLECTION)
+        logger.info(f"Pipeline run {run_id} {run_status}: {status}")
+        return {"run_id": run_id, "status": run_status, "stages": status}
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from config import PREDICTION_CACHE_MEMORY_ITEMS
+from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+CACHE_COLLECTION = "prediction_cache"
+
+
+def text_hash(text: str) -> str:
+    """Content hash used as cache key for prepared texts"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of analysis results keyed by (text hash, model id):
+    an in-memory LRU in front of the 'prediction_cache' Mongo collection.
+    """
+
+    def __init__(self, mongo_manager: MongoManagerDAO, namespace: str, model_id, max_memory_items: int = PREDICTION_CACHE_MEMORY_ITEMS):
+        self.mongo_manager = mongo_manager
+        self.namespace = namespace
+        self.model_id = str(model_id)
+        self.max_memory_items = max_memory_items
+        self.memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+        self.mongo_manager.create_index([("namespace", 1), ("model_id", 1), ("text_hash", 1)], CACHE_COLLECTION, unique=True)
+
+    def _remember(self, key: str, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+
+    def get_many(self, hashes: list[str]) -> dict:
+        """Return cached results for the given text hashes (missing hashes are left out)"""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(hashes):
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                found[key] = self.memory[key]
+            else:
+                missing.append(key)
+        self.stats["memory_hits"] += len(found)
+        CACHE_LOOKUPS.inc(len(found), namespace=self.namespace, result="memory_hit")
+
+        if missing:
+            documents = self.mongo_manager.find(
+                {"namespace": self.namespace, "model_id": self.model_id, "text_hash": {"$in": missing}},
+                CACHE_COLLECTION,
+                projection={"_id": 0, "text_hash": 1, "result": 1},
+            )
+            for document in documents:
+                found[document["text_hash"]] = document["result"]
+                self._remember(document["text_hash"], document["result"])
+            self.stats["store_hits"] += len(documents)
+            self.stats["misses"] += len(missing) - len(documents)
+            CACHE_LOOKUPS.inc(len(documents), namespace=self.namespace, result="store_hit")
+            CACHE_LOOKUPS.inc(len(missing) - len(documents), namespace=self.namespace, result="miss")
+
+        return found
+
+    def put_many(self, results: dict):
+        """Store results computed for text hashes in both tiers"""
+        if not results:
+            return
+        for key, result in results.items():
+            self._remember(key, result)
+        records = [
+            {"namespace": self.namespace, "model_id": self.model_id, "text_hash": key, "result": result, "created_at": datetime.now()}
+            for key, result in results.items()
+        ]
+        self.mongo_manager.bulk_upsert(records, ["namespace", "model_id", "text_hash"], CACHE_COLLECTION)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["memory_hits"] + self.stats["store_hits"] + self.stats["misses"]
+        return (self.stats["memory_hits"] + self.stats["store_hits"]) / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logger.info(
+            f"Prediction cache '{self.namespace}': hit rate {self.hit_rate:.1%} "
+            f"(memory {self.stats['memory_hits']}, store {self.stats['store_hits']}, misses {self.stats['misses']})"
+        )
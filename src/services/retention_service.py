@@ -0,0 +1,109 @@
+import logging
+from datetime import UTC, datetime, timedelta
+
+from bson import Binary, ObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+from config import RETENTION_BATCH_SIZE, RETENTION_HOT_DAYS
+from dao.mongo_manager_dao import COLD_SUFFIX, MongoManagerDAO, pack_cold_fields, unpack_cold_fields
+from metrics import ITEMS_PROCESSED, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Heavy fields moved to cold storage, per collection; everything else (ids, links, labels,
+# keyphrases, dates) stays in the hot stub so indexes and current queries keep working
+RETENTION_POLICIES = {
+    "rss_feeds_data": ("content", "summary", "description", "analysis_text"),
+    "feed_sentiment_analysis": ("text_preview", "all_scores"),
+    "feed_topic_analysis": ("text_preview",),
+}
+
+
+class RetentionService:
+    """
+    Tiered retention: documents older than hot_days, by the creation time embedded in their
+    ObjectId, have their heavy fields moved zstd-compressed into '<collection>_cold' and are
+    left as stubs marked "archived": True. MongoManagerDAO.find/find_one rehydrate stubs
+    transparently, so readers do not need to know which tier a document is in. Heavy fields
+    written again into a stub are moved on the next run and merged into its cold record.
+    """
+
+    def __init__(
+        self, mongo_manager: MongoManagerDAO, hot_days: int = RETENTION_HOT_DAYS, batch_size: int = RETENTION_BATCH_SIZE, policies: dict = RETENTION_POLICIES
+    ):
+        self.mongo_manager = mongo_manager
+        self.hot_days = hot_days
+        self.batch_size = batch_size
+        self.policies = policies
+
+    def _expired_query(self, fields: tuple) -> dict:
+        """Documents older than hot_days still holding any heavy field, including stubs it was written into again"""
+        cutoff = datetime.now(UTC) - timedelta(days=self.hot_days)
+        return {"_id": {"$lt": ObjectId.from_datetime(cutoff)}, "$or": [{field: {"$exists": True}} for field in fields]}
+
+    def pending_counts(self) -> dict:
+        """Documents per collection that the next run would archive"""
+        return {
+            collection_name: self.mongo_manager.count_documents(self._expired_query(fields), collection_name)
+            for collection_name, fields in self.policies.items()
+        }
+
+    def _cold_fields(self, cold_collection: str, document_ids: list) -> dict:
+        """Fields already in cold storage per document _id"""
+        if not document_ids:
+            return {}
+        records = self.mongo_manager.find({"_id": {"$in": document_ids}}, cold_collection, projection={"data": 1}, rehydrate=False)
+        return {record["_id"]: unpack_cold_fields(record["data"]) for record in records}
+
+    def archive_collection(self, collection_name: str, fields: tuple) -> int:
+        """Move the heavy fields of the expired documents of one collection to cold storage"""
+        query = self._expired_query(fields)
+        cold_collection = f"{collection_name}{COLD_SUFFIX}"
+        archived = 0
+
+        while True:
+            # Archived documents leave the query, so each batch starts again from the oldest left
+            documents = self.mongo_manager.find(
+                query,
+                collection_name,
+                sort=[("_id", 1)],
+                projection={"archived": 1, **{field: 1 for field in fields}},
+                limit=self.batch_size,
+                rehydrate=False,
+            )
+            if not documents:
+                break
+
+            archived_at = datetime.now()
+            # Stubs keep their earlier cold fields; values written since then replace them
+            previous = self._cold_fields(cold_collection, [document["_id"] for document in documents if document.get("archived")])
+            cold_operations, hot_operations = [], []
+            for document in documents:
+                moved = {**previous.get(document["_id"], {}), **{field: document[field] for field in fields if field in document}}
+                cold_document = {"_id": document["_id"], "data": Binary(pack_cold_fields(moved)), "fields": list(moved), "archived_at": archived_at}
+                cold_operations.append(ReplaceOne({"_id": document["_id"]}, cold_document, upsert=True))
+                hot_operations.append(
+                    UpdateOne(
+                        {"_id": document["_id"]},
+                        {"$set": {"archived": True, "archived_at": archived_at}, "$unset": {field: "" for field in fields}},
+                    )
+                )
+
+            # Cold copies are written first, so an interrupted run never leaves a stub without its data
+            self.mongo_manager.bulk_write(cold_operations, cold_collection)
+            self.mongo_manager.bulk_write(hot_operations, collection_name)
+            archived += len(documents)
+            ITEMS_PROCESSED.inc(len(documents), component="retention", outcome="archived")
+            logger.info(f"Archived {archived} documents of '{collection_name}' into '{cold_collection}'")
+
+        return archived
+
+    def run(self) -> dict:
+        """Apply every retention policy; returns the number of documents archived per collection"""
+        logger.info(f"Applying retention: documents older than {self.hot_days} days move to cold storage")
+        summary = {}
+        for collection_name, fields in self.policies.items():
+            with STAGE_SECONDS.time(component="retention", stage=collection_name):
+                summary[collection_name] = self.archive_collection(collection_name, fields)
+        logger.info(f"Retention completed: {summary}")
+        return summary
@@ -1,14 +1,30 @@
 import logging
+import queue
+import urllib.request
 from datetime import datetime, timedelta
 
 import feedparser
 from bs4 import BeautifulSoup
-
-from src.config import FEEDS_UPDATE_HOURS, RSS_COLLECTION, RSS_FEEDS
-from src.dao.mongo_manager_dao import MongoManagerDAO
+from pymongo.errors import OperationFailure
+
+from config import (
+    FEEDS_UPDATE_HOURS,
+    RAW_ARCHIVE_BACKEND,
+    RAW_ARCHIVE_DIR,
+    RAW_ARCHIVE_ZSTD_LEVEL,
+    RSS_COLLECTION,
+    RSS_FEEDS,
+    RSS_FETCH_TIMEOUT_SECONDS,
+)
+from dao.mongo_manager_dao import MongoManagerDAO
+from dao.raw_archive_dao import RawArchiveDAO
+from metrics import ITEMS_PROCESSED, STAGE_SECONDS
+from services.analysis_text import analysis_text_fields, backfill_analysis_text
 
 logger = logging.getLogger(__name__)
 
+USER_AGENT = "Mozilla/5.0 (compatible; trader-charts-data-collector)"
+
 # ---------------- Helper Functions ----------------
 
 
@@ -52,12 +68,123 @@ def html_to_text(html: str) -> str:
     return soup.get_text(separator=" ").strip()
 
 
+def fetch_feed_bytes(url: str, timeout: float = RSS_FETCH_TIMEOUT_SECONDS) -> bytes:
+    """Download the raw feed document, kept as bytes so it can be archived before parsing"""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def parse_feed_entries(payload: bytes, rss_feed: dict, execution_id=None, fetched_at: datetime | None = None) -> list[dict]:
+    """
+    Parse a raw feed document into rss_feeds_data items. Pure function of its arguments, so
+    archived payloads can be re-parsed offline; fetched_at replaces a missing publication date.
+    """
+    feed = feedparser.parse(payload)
+    items = []
+
+    for entry in feed.entries:
+        # Extract image URL
+        image_url = get_image_url(entry)
+
+        # Build item dictionary with execution_id
+        item = {
+            "sourceId": rss_feed["sourceId"],
+            "source_name": rss_feed["name"],
+            "title": html_to_text(entry.get("title", "")),
+            "summary": html_to_text(entry.get("summary", "")),
+            "content": html_to_text(entry.get("content", [{}])[0].get("value", "")),
+            "description": html_to_text(entry.get("description", "")),
+            "link": entry.get("link"),
+            "pubDate": entry.get("published", str(fetched_at or datetime.now())),
+            "source": rss_feed["url"],
+            "image_url": image_url,
+            "author": entry.get("author"),
+            "tags": [tag.term for tag in entry.get("tags", [])],
+            "execution_id": execution_id,  # Associate with current execution
+        }
+        # Canonical text read by the analyzers, computed once here
+        item.update(analysis_text_fields(item))
+
+        items.append(item)
+
+    return items
+
+
 # ---------------- Main RSS Service ----------------
 
 
 class RSSCollectorService:
-    def __init__(self, mongo_manager: MongoManagerDAO):
+    def __init__(self, mongo_manager: MongoManagerDAO, analysis_queue: queue.Queue | None = None, raw_archive: RawArchiveDAO | None = None):
         self.mongo_manager = mongo_manager
+        # When set, newly inserted items are pushed here for in-process streaming analysis
+        self.analysis_queue = analysis_queue
+        # Raw fetched payloads are archived for offline replays, unless RAW_ARCHIVE_BACKEND is empty
+        if raw_archive is None and RAW_ARCHIVE_BACKEND:
+            raw_archive = RawArchiveDAO(mongo_manager, RAW_ARCHIVE_BACKEND, RAW_ARCHIVE_DIR, RAW_ARCHIVE_ZSTD_LEVEL)
+        self.raw_archive = raw_archive
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        """Unique link index, so repeated or concurrent collections of a feed cannot store an item twice"""
+        try:
+            self.mongo_manager.create_index([("link", 1)], RSS_COLLECTION, unique=True, partial_filter={"link": {"$type": "string"}})
+        except OperationFailure as e:
+            # Duplicates stored before the index existed prevent it; insert_list still skips known links
+            logger.warning(f"Could not create unique link index on '{RSS_COLLECTION}', using a regular one: {e}")
+            self.mongo_manager.create_index([("link", 1)], RSS_COLLECTION)
+
+    def _fetch_feed_items(self, rss_feed: dict, execution_id) -> list[dict] | None:
+        """
+        Fetch one feed, archive its raw payload and build its items, tagged with the execution (or job)
+        that collected them. Returns None when the feed could not be downloaded.
+        """
+        try:
+            with STAGE_SECONDS.time(component="rss_collector", stage="fetch_feed"):
+                payload = fetch_feed_bytes(rss_feed["url"])
+        except (OSError, ValueError) as e:
+            # HTTP, DNS and timeout errors (URLError is an OSError); one unreachable feed must not stop the others
+            ITEMS_PROCESSED.inc(component="rss_collector", outcome="fetch_failed")
+            logger.error(f"Could not fetch feed {rss_feed['url']}: {e}")
+            return None
+        fetched_at = datetime.now()
+
+        if self.raw_archive is not None:
+            try:
+                self.raw_archive.store(payload, rss_feed, fetched_at)
+            except Exception as e:
+                # The archive only enables later replays, collection goes on without it
+                logger.error(f"Could not archive raw payload of {rss_feed['url']}: {e}")
+
+        items = parse_feed_entries(payload, rss_feed, execution_id, fetched_at)
+        ITEMS_PROCESSED.inc(len(items), component="rss_collector", outcome="collected")
+        if items:
+            logger.info(f"Collected {len(items)} items from {rss_feed['url']}")
+        else:
+            logger.warning(f"No items found in feed {rss_feed['url']}")
+        return items
+
+    def _store_items(self, items: list[dict]) -> list[dict]:
+        """Insert items not stored yet (deduplicated by link) and hand them to the streaming analysis"""
+        inserted_items = self.mongo_manager.insert_list(items, RSS_COLLECTION)
+        ITEMS_PROCESSED.inc(len(inserted_items), component="rss_collector", outcome="inserted")
+        logger.info(f"Inserted {len(inserted_items)} of {len(items)} collected items into feeds collection")
+
+        if self.analysis_queue is not None:
+            for item in inserted_items:
+                self.analysis_queue.put(item)
+        return inserted_items
+
+    def collect_feed(self, rss_feed: dict, execution_id=None) -> dict:
+        """
+        Fetch and store a single feed, without the execution log bookkeeping of fetch_and_store.
+        Safe to repeat: items already stored are skipped by link.
+        """
+        items = self._fetch_feed_items(rss_feed, execution_id)
+        if items is None:
+            return {"collected": 0, "inserted": 0, "fetch_failed": True}
+        inserted_items = self._store_items(items) if items else []
+        return {"collected": len(items), "inserted": len(inserted_items), "fetch_failed": False}
 
     def fetch_and_store(self, rss_feeds: list = RSS_FEEDS, hours_threshold: int = FEEDS_UPDATE_HOURS):
         """Main method to fetch RSS feeds and store in database with execution tracking"""
@@ -102,7 +229,18 @@ class RSSCollectorService:
                     logger.info(f"Skipping execution - Last successful run was {time_since_last} ago")
                     return
 
-            # 3. Remove old feeds from today's executions
+            # 3. Process feeds and associate with execution_id
+            all_items = []
+            fetched_source_ids = []
+
+            for rss_feed in rss_feeds:
+                items = self._fetch_feed_items(rss_feed, execution_id)
+                if items is not None:
+                    all_items.extend(items)
+                    fetched_source_ids.append(rss_feed["sourceId"])
+
+            # 4. Remove old feeds from today's executions, only once fetching is over and only
+            # for the sources fetched again, so an unreachable feed keeps its items
             today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             today_executions = self.mongo_manager.find(
                 {"process_name": "main_collect_feeds", "execution_time": {"$gte": today_start}},
@@ -111,50 +249,15 @@ class RSSCollectorService:
 
             today_execution_ids = [execution["_id"] for execution in today_executions]
 
-            if today_execution_ids:
-                deleted_count = self.mongo_manager.delete_many({"execution_id": {"$in": today_execution_ids}}, RSS_COLLECTION)
+            if today_execution_ids and fetched_source_ids:
+                deleted_count = self.mongo_manager.delete_many(
+                    {"execution_id": {"$in": today_execution_ids}, "sourceId": {"$in": fetched_source_ids}}, RSS_COLLECTION
+                )
                 logger.info(f"Deleted {deleted_count} old feeds from today's executions")
 
-            # 4. Process feeds and associate with execution_id
-            all_items = []
-
-            for rss_feed in rss_feeds:
-                feed = feedparser.parse(rss_feed["url"])
-                items = []
-
-                for entry in feed.entries:
-                    # Extract image URL
-                    image_url = get_image_url(entry)
-
-                    # Build item dictionary with execution_id
-                    item = {
-                        "sourceId": rss_feed["sourceId"],
-                        "source_name": rss_feed["name"],
-                        "title": html_to_text(entry.get("title", "")),
-                        "summary": html_to_text(entry.get("summary", "")),
-                        "content": html_to_text(entry.get("content", [{}])[0].get("value", "")),
-                        "description": html_to_text(entry.get("description", "")),
-                        "link": entry.get("link"),
-                        "pubDate": entry.get("published", str(datetime.now())),
-                        "source": rss_feed["url"],
-                        "image_url": image_url,
-                        "author": entry.get("author"),
-                        "tags": [tag.term for tag in entry.get("tags", [])],
-                        "execution_id": execution_id,  # Associate with current execution
-                    }
-
-                    items.append(item)
-
-                if items:
-                    all_items.extend(items)
-                    logger.info(f"Collected {len(items)} items from {rss_feed['url']}")
-                else:
-                    logger.warning(f"No items found in feed {rss_feed['url']}")
-
             # 5. Insert all collected feeds
             if all_items:
-                self.mongo_manager.insert_list(all_items, RSS_COLLECTION)
-                logger.info(f"Inserted {len(all_items)} total items into feeds collection")
+                self._store_items(all_items)
 
             # 6. Update execution record as success
             end_time = datetime.now()
@@ -185,3 +288,7 @@ class RSSCollectorService:
             )
             logger.error(f"RSS collection failed after {execution_duration:.2f} seconds: {str(e)}")
             raise
+
+    def backfill_analysis_text(self) -> int:
+        """Add or recompute analysis_text for items stored without the current builder version"""
+        return backfill_analysis_text(self.mongo_manager, RSS_COLLECTION)
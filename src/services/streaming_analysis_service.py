@@ -0,0 +1,128 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from config import STREAM_BATCH_SIZE, STREAM_MAX_WAIT_SECONDS
+from dao.mongo_manager_dao import MongoManagerDAO
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_COLLECTION = "stream_checkpoints"
+FEEDS_COLLECTION = "rss_feeds_data"
+
+
+class StreamingAnalysisService:
+    """
+    Scores newly ingested feeds within seconds of insertion.
+    Feeds arrive from a Mongo change stream on rss_feeds_data or from an in-process queue
+    filled by RSSCollectorService, and are micro-batched through every analyzer
+    (objects exposing process_batch(feeds)). After each batch the change stream resume token
+    and the last feed _id are checkpointed, so a restart continues where it stopped.
+    Feeds of a failed batch are left unmarked and picked up by the next incremental batch run.
+    """
+
+    def __init__(
+        self,
+        mongo_manager: MongoManagerDAO,
+        analyzers: list,
+        checkpoint_name: str = "rss_feeds_analysis",
+        batch_size: int = STREAM_BATCH_SIZE,
+        max_wait_seconds: float = STREAM_MAX_WAIT_SECONDS,
+    ):
+        self.mongo_manager = mongo_manager
+        self.analyzers = analyzers
+        self.checkpoint_name = checkpoint_name
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.stop_event = threading.Event()
+
+    # ---------------- Checkpoints ----------------
+
+    def _load_checkpoint(self) -> dict:
+        return self.mongo_manager.find_one({"_id": self.checkpoint_name}, CHECKPOINTS_COLLECTION) or {}
+
+    def _save_checkpoint(self, last_feed_id, resume_token: dict | None = None):
+        update = {"last_feed_id": last_feed_id, "updated_at": datetime.now()}
+        if resume_token is not None:
+            update["resume_token"] = resume_token
+        self.mongo_manager.bulk_upsert([{"_id": self.checkpoint_name, **update}], ["_id"], CHECKPOINTS_COLLECTION)
+
+    # ---------------- Processing ----------------
+
+    def _process_batch(self, feeds: list[dict]):
+        start_time = time.monotonic()
+        for analyzer in self.analyzers:
+            try:
+                with STAGE_SECONDS.time(component="streaming", stage=type(analyzer).__name__):
+                    analyzer.process_batch(feeds)
+            except Exception as e:
+                logger.error(f"{type(analyzer).__name__} failed on a batch of {len(feeds)} feeds: {e}")
+        logger.info(f"Analyzed batch of {len(feeds)} feeds in {time.monotonic() - start_time:.2f} seconds")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_change_stream(self):
+        """Consume rss_feeds_data inserts through a change stream, resuming from the saved token"""
+        checkpoint = self._load_checkpoint()
+        resume_token = checkpoint.get("resume_token")
+        logger.info(f"Watching '{FEEDS_COLLECTION}' inserts ({'resuming' if resume_token else 'starting now'})")
+
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        with self.mongo_manager.watch(FEEDS_COLLECTION, pipeline, resume_after=resume_token) as stream:
+            batch = []
+            deadline = None
+            while stream.alive and not self.stop_event.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    batch.append(change["fullDocument"])
+                    deadline = deadline or time.monotonic() + self.max_wait_seconds
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._process_batch(batch)
+                    self._save_checkpoint(batch[-1]["_id"], stream.resume_token)
+                    batch = []
+                    deadline = None
+
+            if batch:
+                self._process_batch(batch)
+                self._save_checkpoint(batch[-1]["_id"], stream.resume_token)
+
+    def _catch_up(self, last_feed_id):
+        """Analyze feeds inserted after the checkpoint while no consumer was running"""
+        if last_feed_id is None:
+            return
+        feeds = self.mongo_manager.find({"_id": {"$gt": last_feed_id}}, FEEDS_COLLECTION, sort=[("_id", 1)])
+        logger.info(f"Catching up {len(feeds)} feeds inserted since the last checkpoint")
+        for start in range(0, len(feeds), self.batch_size):
+            batch = feeds[start : start + self.batch_size]
+            self._process_batch(batch)
+            self._save_checkpoint(batch[-1]["_id"])
+
+    def run_queue(self, feeds_queue: queue.Queue):
+        """Consume feeds pushed by an in-process RSSCollectorService until stop() is called"""
+        self._catch_up(self._load_checkpoint().get("last_feed_id"))
+        logger.info("Waiting for feeds from the in-process collector queue")
+
+        batch = []
+        deadline = None
+        while not self.stop_event.is_set():
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else self.max_wait_seconds
+            try:
+                batch.append(feeds_queue.get(timeout=timeout))
+                deadline = deadline or time.monotonic() + self.max_wait_seconds
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._process_batch(batch)
+                self._save_checkpoint(max(feed["_id"] for feed in batch))
+                batch = []
+                deadline = None
+
+        if batch:
+            self._process_batch(batch)
+            self._save_checkpoint(max(feed["_id"] for feed in batch))
@@ -0,0 +1,20 @@
+from services.analysis_text import build_analysis_text
+
+
+def test_title_inside_content_is_kept():
+    item = {"title": "Sube el dólar", "content": "Tras la apertura Sube el dólar y caen los bonos."}
+    assert build_analysis_text(item) == "Sube el dólar. Tras la apertura Sube el dólar y caen los bonos"
+
+
+def test_segments_contained_in_a_longer_one_are_not_merged():
+    assert build_analysis_text({"title": "a", "description": "b", "content": "ab"}) == "a. ab"
+
+
+def test_prefix_of_previous_segment_is_skipped():
+    item = {"title": "Bonos", "description": "Los bonos suben", "content": "Los bonos suben. Detalle del mercado", "summary": "Los bonos suben"}
+    assert build_analysis_text(item) == "Bonos. Los bonos suben. Detalle del mercado"
+
+
+def test_exact_duplicates_and_empty_segments_are_skipped():
+    item = {"title": "Cae el Merval", "description": "Resumen  del día.", "content": "", "summary": "Resumen del día"}
+    assert build_analysis_text(item) == "Cae el Merval. Resumen del día"
@@ -0,0 +1,29 @@
+import os
+
+from services.evaluation_cache import model_fingerprint
+
+
+def _write(path, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as model_file:
+        model_file.write(content)
+
+
+def test_onnx_export_keeps_the_model_fingerprint(tmp_path):
+    model_path = str(tmp_path / "model")
+    _write(os.path.join(model_path, "config.json"), b"{}")
+    _write(os.path.join(model_path, "model.safetensors"), b"weights")
+    fingerprint = model_fingerprint(model_path)
+
+    _write(os.path.join(model_path, "onnx", "model.onnx"), b"exported")
+    _write(os.path.join(model_path, "onnx", "model.int8.onnx"), b"quantized")
+    assert model_fingerprint(model_path) == fingerprint
+
+
+def test_changed_weights_change_the_model_fingerprint(tmp_path):
+    model_path = str(tmp_path / "model")
+    _write(os.path.join(model_path, "model.safetensors"), b"weights")
+    fingerprint = model_fingerprint(model_path)
+
+    _write(os.path.join(model_path, "model.safetensors"), b"retrained weights")
+    assert model_fingerprint(model_path) != fingerprint
@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from dao.mongo_manager_dao import MongoManagerDAO
+from services.keyphrase_index_service import COUNTS_COLLECTION, TRENDS_COLLECTION, KeyphraseIndex
+
+# The index relies on aggregation and pipeline updates, so it is tested against a real server
+TEST_MONGO_URI = os.getenv("TEST_MONGO_URI")
+pytestmark = pytest.mark.skipif(not TEST_MONGO_URI, reason="TEST_MONGO_URI is not set")
+
+
+def _database(name: str) -> MongoManagerDAO:
+    mongo_manager = MongoManagerDAO(TEST_MONGO_URI, name)
+    mongo_manager.client.drop_database(name)
+    return mongo_manager
+
+
+@pytest.fixture
+def mongo_manager():
+    mongo_manager = _database("test_keyphrase_index")
+    yield mongo_manager
+    mongo_manager.client.drop_database("test_keyphrase_index")
+
+
+def _analyses():
+    return [
+        {"feedId": ObjectId(), "pubDate": "2025-01-06T10:15:00", "analysis_date": datetime(2025, 2, 1), "keyphrases": [{"phrase": "Dólar"}]},
+        {"feedId": ObjectId(), "pubDate": "2025-01-06T10:45:00", "analysis_date": datetime(2025, 2, 1), "keyphrases": [{"phrase": "dólar"}]},
+    ]
+
+
+def _state(mongo_manager):
+    counts = {(c["granularity"], c["phrase"]): c["count"] for c in mongo_manager.find({}, COUNTS_COLLECTION)}
+    mentions = {t["phrase"]: t["mentions"] for t in mongo_manager.find({}, TRENDS_COLLECTION)}
+    log_scores = {t["phrase"]: t["log_score"] for t in mongo_manager.find({}, TRENDS_COLLECTION)}
+    return counts, mentions, log_scores
+
+
+def _assert_same_state(actual, expected):
+    assert actual[:2] == expected[:2]
+    # Scores are recomputed relative to the current time, so they only match up to rounding
+    assert actual[2] == pytest.approx(expected[2])
+
+
+def test_reindexing_does_not_inflate_counts(mongo_manager):
+    index = KeyphraseIndex(mongo_manager)
+    analyses = _analyses()
+    index.index_analyses(analyses)
+    first = _state(mongo_manager)
+    index.index_analyses(analyses)
+
+    assert first[0] == {("hour", "dólar"): 2, ("day", "dólar"): 2}
+    assert first[1] == {"dólar": 2}
+    _assert_same_state(_state(mongo_manager), first)
+
+
+def test_retry_after_failure_between_postings_and_counts(mongo_manager, monkeypatch):
+    index = KeyphraseIndex(mongo_manager)
+    analyses = _analyses()
+    index.index_analyses(analyses[:1])
+    expected_index = KeyphraseIndex(_database("test_keyphrase_index_expected"))
+    expected_index.index_analyses(analyses)
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("crashed after writing postings")
+
+    monkeypatch.setattr(index, "_refresh_counts", crash)
+    with pytest.raises(RuntimeError):
+        index.index_analyses(analyses)
+    monkeypatch.undo()
+
+    # The retry finds every posting already written and still restores the missing counts
+    index.index_analyses(analyses)
+    _assert_same_state(_state(mongo_manager), _state(expected_index.mongo_manager))
+    expected_index.mongo_manager.client.drop_database("test_keyphrase_index_expected")
+    assert index.feeds_mentioning("DÓLAR", since=datetime(2025, 1, 6)) == [analyses[1]["feedId"], analyses[0]["feedId"]]
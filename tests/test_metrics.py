@@ -0,0 +1,32 @@
+from metrics import MetricsRegistry
+
+
+def _registry():
+    registry = MetricsRegistry()
+    counter = registry.counter("items", "Items", ("outcome",))
+    histogram = registry.histogram("latency", "Latency", ("stage",), buckets=(1, 10))
+    return registry, counter, histogram
+
+
+def test_worker_metrics_merge_into_parent():
+    parent, parent_counter, parent_histogram = _registry()
+    worker, worker_counter, worker_histogram = _registry()
+    parent_counter.inc(2, outcome="ok")
+    worker_counter.inc(3, outcome="ok")
+    worker_counter.inc(outcome="failed")
+    worker_histogram.observe(0.5, stage="score")
+    worker_histogram.observe(5, stage="score")
+
+    parent.merge(worker.collect(reset=True))
+
+    assert parent_counter.value(outcome="ok") == 5
+    assert parent_counter.value(outcome="failed") == 1
+    assert parent_histogram.collect()[("score",)] == {"buckets": [1, 1], "sum": 5.5, "count": 2}
+    # Reset values are not merged twice
+    assert worker.collect() == {}
+
+
+def test_unregistered_metrics_are_skipped():
+    parent, parent_counter, _ = _registry()
+    parent.merge({"unknown": {("x",): 1}})
+    assert parent.collect() == {}